@@ -1,15 +1,216 @@
 
-from scipy.stats import beta
+from array import array
+import functools
 import math
-import matplotlib.pyplot as plt
+import os
 import numpy as np
+from profiling import profiler
 from settings import *
 
+def beta_cdf(x, a, b):
+    """Evaluate the CDF of the beta distribution. The CDF at 0.5 of integer
+    alpha and beta, which agents evaluate when they decide, is computed
+    exactly by half_cdf, so scipy is only imported to grow DecisionBoundary
+    tables or for other points and priors.
+
+    Args:
+        x (float): point the CDF is evaluated at
+        a (int | np.ndarray): alpha of the distribution
+        b (int | np.ndarray): beta of the distribution
+
+    Returns:
+        float | np.ndarray: probability of a value below x
+    """
+    if x == 0.5 and np.ndim(a) == 0 and np.ndim(b) == 0 and float(a).is_integer() and float(b).is_integer():
+        return half_cdf(int(a), int(b))
+    from scipy.stats import beta
+    return beta.cdf(x, a, b, loc=0, scale=1)
+
+@functools.lru_cache(maxsize=65536)
+def half_cdf(a:int, b:int) -> float:
+    """Return the CDF at 0.5 of the beta distribution of integer alpha and
+    beta. It is the probability of at least a successes in n = a + b - 1
+    fair trials, of which the shorter tail of the binomial coefficients is
+    summed exactly.
+
+    Args:
+        a (int): alpha of the distribution, at least 1
+        b (int): beta of the distribution, at least 1
+
+    Returns:
+        float: probability of a value below 0.5
+    """
+    n = a + b - 1
+    upper = a > n - a
+    first, last = (a, n) if upper else (0, a - 1)
+    term = math.comb(n, first)
+    total = 0
+    for j in range(first, last + 1):
+        total += term
+        term = term * (n - j) // (j + 1)
+    return (total if upper else (1 << n) - total) / (1 << n)
+
+class DecisionBoundary:
+    """
+    Table of the decision boundaries of the Bayesian algorithm for a given
+    prior and credible threshold. For n observations, of which k were
+    successes, an agent decides 0 if k <= lower[n] and 1 if k >= upper[n].
+    The table grows lazily, is shared by every agent with the same prior and
+    threshold and is stored in BOUNDARY_CACHE so other processes start fast.
+    """
+    tables = {}
+
+    def __init__(self, prior = 1, posterior = 0.99) -> None:
+        """Create an empty decision boundary table
+
+        Args:
+            prior (int, optional): the initial value of alpha and beta.
+                Defaults to 1.
+            posterior (float, optional): the credible threshold.
+                Defaults to 0.99.
+        """        
+        self.prior = prior
+        self.posterior = posterior
+        self.lower = np.zeros(0, dtype=np.int64)
+        self.upper = np.zeros(0, dtype=np.int64)
+        self.lower_list = []
+        self.upper_list = []
+
+    @classmethod
+    def get(cls, prior = 1, posterior = 0.99) -> 'DecisionBoundary':
+        """Return the shared table for a prior and threshold, loading it from
+        the cache when it has been computed before.
+
+        Args:
+            prior (int, optional): the initial value of alpha and beta.
+                Defaults to 1.
+            posterior (float, optional): the credible threshold.
+                Defaults to 0.99.
+
+        Returns:
+            DecisionBoundary: the shared table
+        """        
+        key = (prior, posterior)
+        if key not in cls.tables:
+            table = cls(prior, posterior)
+            table.load()
+            cls.tables[key] = table
+        return cls.tables[key]
+
+    def __reduce__(self):
+        # Pickled agents share the table of their process instead of a copy
+        return DecisionBoundary.get, (self.prior, self.posterior)
+
+    def path(self) -> str:
+        """Return the path of the table in the cache.
+
+        Returns:
+            str: path of the cached table
+        """        
+        return os.path.join(BOUNDARY_CACHE, f'boundary_{self.prior}_{self.posterior}.npz')
+
+    def load(self) -> None:
+        """Load the table from the cache if it exists.
+        """        
+        try:
+            with np.load(self.path()) as data:
+                self.set_table(data['lower'], data['upper'])
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def save(self) -> None:
+        """Store the table in the cache. The file is replaced atomically so
+        processes sharing the cache never read a partial table.
+        """        
+        try:
+            os.makedirs(BOUNDARY_CACHE, exist_ok=True)
+            temporary = f'{self.path()}.{os.getpid()}.npz'
+            np.savez(temporary, lower=self.lower, upper=self.upper)
+            os.replace(temporary, self.path())
+        except OSError:
+            pass
+
+    def set_table(self, lower: np.ndarray, upper: np.ndarray) -> None:
+        """Replace the boundaries.
+
+        Args:
+            lower (np.ndarray): largest number of successes deciding 0
+            upper (np.ndarray): smallest number of successes deciding 1
+        """        
+        self.lower = np.asarray(lower, dtype=np.int64)
+        self.upper = np.asarray(upper, dtype=np.int64)
+        self.lower_list = self.lower.tolist()
+        self.upper_list = self.upper.tolist()
+
+    def grow(self, n: int) -> None:
+        """Make sure the table covers n observations. The table at least
+        doubles, and each boundary is found by a vectorised bisection on the
+        beta CDF, which is monotonic in the number of successes.
+
+        Args:
+            n (int): number of observations
+        """        
+        size = len(self.lower)
+        if n < size:
+            return
+        observations = np.arange(size, max(n + 1, 2 * size, 64))
+        lower = self.bisect(observations, lambda p: p > self.posterior)
+        upper = self.bisect(observations, lambda p: (1 - p) <= self.posterior) + 1
+        self.set_table(np.concatenate((self.lower, lower)), np.concatenate((self.upper, upper)))
+        self.save()
+
+    def bisect(self, observations: np.ndarray, condition) -> np.ndarray:
+        """Find for every number of observations the largest number of
+        successes for which the condition on the beta CDF holds.
+
+        Args:
+            observations (np.ndarray): numbers of observations
+            condition (callable): condition on the CDF, true for few successes
+
+        Returns:
+            np.ndarray: largest number of successes, -1 if there is none
+        """        
+        low = np.full(len(observations), -1)
+        high = observations + 1
+        active = high - low > 1
+        while active.any():
+            middle = np.maximum((low + high) // 2, 0)
+            p = beta_cdf(0.5, self.prior + middle, self.prior + observations - middle)
+            profiler.count('cdf', observations.size)
+            holds = condition(p) & active
+            low = np.where(holds, middle, low)
+            high = np.where(active & ~holds, middle, high)
+            active = high - low > 1
+        return low
+
+    def decide(self, alpha, beta) -> int:
+        """Return the decision of an agent with the given beta model.
+
+        Args:
+            alpha (int): alpha of the beta model
+            beta (int): beta of the beta model
+
+        Returns:
+            int: -1 if undecided, 0 or 1 otherwise
+        """        
+        n = round(alpha + beta - 2 * self.prior)
+        if n >= len(self.lower_list):
+            self.grow(n)
+        k = round(alpha - self.prior)
+        if k <= self.lower_list[n]:
+            return 0
+        if k >= self.upper_list[n]:
+            return 1
+        return -1
+
 class BayesianAlgorithm:
     """
     Class that represents the Bayesian algorithm
     """ 
-    def __init__(self, posterior= 0.99, prior = 1, positive_feedback = True, main_colour=WHITE) -> None:
+    __slots__ = ('decision', 'prior', 'alpha', 'beta', 'last_C', 'positive_feedback',
+        'posterior', 'main_colour', 'pcs', 'boundary')
+
+    def __init__(self, posterior= 0.99, prior = 1, positive_feedback = True, main_colour=WHITE_INDEX) -> None:
         """ Create Bayesian Algorithm object
         Args:
             posterior (float, optional): the credible threshold which determines
@@ -20,8 +221,8 @@ class BayesianAlgorithm:
                 Defaults to 1.
             positive_feedback (bool, optional): controls if agent broadcast the 
                 decision. Defaults to True.
-            main_colour (set(int), optional): the colour seen as success in a 
-                beta model. Defaults to WHITE.
+            main_colour (int, optional): index in COLOURS of the colour seen
+                as success in a beta model. Defaults to WHITE_INDEX.
         """        
         self.decision = -1
         self.prior = prior
@@ -32,13 +233,14 @@ class BayesianAlgorithm:
         self.posterior = posterior
         self.main_colour = main_colour
         self.pcs = {}
+        self.boundary = DecisionBoundary.get(prior, posterior)
     
     def reset(self, colour):
         """Resets the algorithm's attribuates to its initial values and set
         a new main colour. 
 
         Args:
-            colour (set(int)): RGB values of the colour
+            colour (int): index of the colour in COLOURS
         """        
         self.decision = -1
         self.alpha = self.prior
@@ -48,9 +250,10 @@ class BayesianAlgorithm:
 
     def update(self, observation):
         """Update the agent's observations and check if the credible threshold has
-        been overcame by the beta model.
+        been overcame by the beta model. The check is a lookup in the shared
+        decision boundary table; the CDF is only evaluated once a decision is made.
         Args:
-            observation (set(int)): RGB colours of the observed tile.
+            observation (int): index in COLOURS of the observed tile's colour
         """        
         C = 0
         if observation == self.main_colour:
@@ -59,12 +262,10 @@ class BayesianAlgorithm:
         self.alpha += C
         self.beta += (1 - C)        
         if self.decision == -1:
-            p = beta.cdf(0.5, self.alpha, self.beta, loc=0, scale=1)
-            if p > self.posterior:
-                self.decision = 0
-                self.pcs[self.main_colour] = (1 -p)
-            elif (1 - p) > self.posterior:
-                self.decision = 1
+            self.decision = self.boundary.decide(self.alpha, self.beta)
+            if self.decision != -1:
+                profiler.count('cdf')
+                p = beta_cdf(0.5, self.alpha, self.beta)
                 self.pcs[self.main_colour] = (1 -p)
 
     def update_ratio(self, observation:int):
@@ -78,17 +279,142 @@ class BayesianAlgorithm:
         self.alpha += observation
         self.beta += (1 - observation)
 
+    def message(self) -> int:
+        """Return the information broadcast to other agents: the decision
+        with positive feedback once decided, the last observation otherwise.
+
+        Returns:
+            int: 0 or 1, None before the first observation
+        """
+        if self.decision != -1 and self.positive_feedback:
+            return self.decision
+        return self.last_C
+
     def __repr__(self) -> str:
         return "Bayesian Algorithm"
 
+class MultiColourAlgorithm(BayesianAlgorithm):
+    """
+    Bayesian algorithm deciding on every colour at once. Every colour has a
+    beta model of that colour against all others, and all of them are
+    updated from the same observations, so no sample is thrown away by a
+    reset. Each model decides through the shared decision boundary table,
+    and the agent has decided once every colour's model has. Messages carry
+    one bit per colour.
+    """
+    __slots__ = ('n_colours', 'alphas', 'betas', 'decisions')
+
+    def __init__(self, n_colours = 3, posterior = 0.99, prior = 1, positive_feedback = True) -> None:
+        """Create multi-colour Bayesian algorithm object
+
+        Args:
+            n_colours (int, optional): number of colours, the first ones of
+                COLOURS. Defaults to 3.
+            posterior (float, optional): the credible threshold. Defaults to 0.99.
+            prior (int, optional): the initial value of every alpha and beta.
+                Defaults to 1.
+            positive_feedback (bool, optional): controls if agent broadcast
+                its decisions. Defaults to True.
+        """
+        super().__init__(posterior, prior, positive_feedback)
+        self.n_colours = n_colours
+        self.reset()
+
+    def reset(self, colour=None):
+        """Resets the beta models of all colours to the prior.
+
+        Args:
+            colour (int, optional): unused, every colour is decided on.
+                Defaults to None.
+        """
+        self.decision = -1
+        self.last_C = None
+        self.alphas = [self.prior] * self.n_colours
+        self.betas = [self.prior] * self.n_colours
+        self.decisions = [-1] * self.n_colours
+        self.pcs = {}
+
+    def update(self, observation):
+        """Update the beta model of every colour with an observation and
+        check every undecided colour against the decision boundary table.
+        Once all colours are decided, the decision is 1 if the main colour
+        is the most likely majority and 0 otherwise.
+
+        Args:
+            observation (int): index in COLOURS of the observed tile's colour
+        """
+        self.last_C = 1 << observation
+        for c in range(self.n_colours):
+            if c == observation:
+                self.alphas[c] += 1
+            else:
+                self.betas[c] += 1
+        if self.decision != -1:
+            return
+        undecided = False
+        for c in range(self.n_colours):
+            if self.decisions[c] != -1:
+                continue
+            decision = self.boundary.decide(self.alphas[c], self.betas[c])
+            if decision == -1:
+                undecided = True
+                continue
+            self.decisions[c] = decision
+            profiler.count('cdf')
+            p = beta_cdf(0.5, self.alphas[c], self.betas[c])
+            self.pcs[c] = (1 - p)
+        if not undecided:
+            self.decision = int(max(self.pcs, key=self.pcs.get) == self.main_colour)
+
+    def update_ratio(self, observation:int):
+        """Add a success to the beta model of every colour whose bit is set.
+
+        Args:
+            observation (int): one bit per colour, in the order of COLOURS
+        """
+        for c in range(self.n_colours):
+            if observation >> c & 1:
+                self.alphas[c] += 1
+
+    def message(self) -> int:
+        """Return the information broadcast to other agents: one bit per
+        colour, the colour's decision with positive feedback once it is
+        decided and whether it was the last observation otherwise.
+
+        Returns:
+            int: one bit per colour, None before the first observation
+        """
+        if self.last_C is None:
+            return None
+        if not self.positive_feedback:
+            return self.last_C
+        bits = 0
+        for c in range(self.n_colours):
+            decision = self.decisions[c]
+            if decision == 1 or (decision == -1 and self.last_C >> c & 1):
+                bits |= 1 << c
+        return bits
+
+    def __repr__(self) -> str:
+        return "Multi-colour Bayesian Algorithm"
+
 class BenchmarkAlgorithm():
-    """ The Benchmark Algorithm
+    """ The Benchmark Algorithm. The last counts received from every agent
+    are stored in arrays indexed by agent id, with running totals that are
+    kept up to date when a count is overwritten.
     """    
-    def __init__(self, n_ghosts:int) -> None:
+    __slots__ = ('decision', 'alpha', 'beta', 's', 't_comm', 'phase_1', 'phase_2', 'id',
+        'alphas', 'betas', 'alpha_t', 'beta_t')
+    # Success of every observed colour index, shared by all agents
+    colour_map = {GREY_INDEX: 0, WHITE_INDEX: 1}
+
+    def __init__(self, n_ghosts:int, id:int = 0) -> None:
         """Create Benchmark object
 
         Args:
             n_ghosts (int): number of agents in the environment.
+            id (int, optional): id of the agent running the algorithm,
+                between 0 and n_ghosts - 1. Defaults to 0.
         """        
         self.decision = -1
         self.alpha = 1
@@ -97,14 +423,17 @@ class BenchmarkAlgorithm():
         self.t_comm = 2 * math.log((n_ghosts ** 2) / 0.1) * (1240)
         self.phase_1 = round(self.s / n_ghosts)
         self.phase_2 = round(self.s + self.t_comm)
-        self.observations = {}
-        self.colour_map = {GREY: 0, WHITE:1}
+        self.id = id
+        self.alphas = array('i', [0]) * n_ghosts
+        self.betas = array('i', [0]) * n_ghosts
+        self.alpha_t = 0
+        self.beta_t = 0
     
     def update(self, observation) -> None:
         """Updates the algorithm accordingly to its phase.
 
         Args:
-            observation (tuple[int]): Tuple representing RGB colours
+            observation (int): index in COLOURS of the observed tile's colour
         """        
         C = self.colour_map[observation]
         if self.phase_1 > 0:
@@ -113,16 +442,11 @@ class BenchmarkAlgorithm():
             return
 
         if self.phase_2 > self.s:
-            self.observations[self] = (self.alpha, self.beta)
+            self.receive_info(self.id, self.alpha, self.beta)
             self.phase_2 -= 1
             return
 
-        alpha_t = 0
-        beta_t = 0
-        for value in self.observations.values():
-            alpha_t += value[0]
-            beta_t += value[1]
-        if beta_t > alpha_t:
+        if self.beta_t > self.alpha_t:
             self.decision = 0
         else:
             self.decision = 1
@@ -136,16 +460,20 @@ class BenchmarkAlgorithm():
         self.alpha += observation
         self.beta += (1 - observation)
     
-    def receive_info(self, id:object, alpha: int, beta: int):
-        """Add observations by other agents to dictonary
+    def receive_info(self, id:int, alpha: int, beta: int):
+        """Store the observations of another agent, replacing the ones it
+        sent before, and update the totals.
 
         Args:
-            id (GhostAgent): another agent
+            id (int): id of another agent
             alpha (int): the other agent's alpha values
             beta (int): the other agent's beta values
         """        
         if self.phase_1 <= 0:
-            self.observations[id] = (alpha, beta)
+            self.alpha_t += alpha - self.alphas[id]
+            self.beta_t += beta - self.betas[id]
+            self.alphas[id] = alpha
+            self.betas[id] = beta
 
     def __repr__(self) -> str:
         return "Benchmark Algorithm"
\ No newline at end of file
@@ -0,0 +1,201 @@
+import gc
+import itertools
+import json
+import platform
+import statistics
+import time
+from game import Game
+from generate import write_layout
+
+# Frames simulated to measure the frame rate of a case
+WINDOW = 100
+# Shortest time of a measurement. Windows and runs shorter than that are
+# repeated and their mean is the measurement
+MIN_TIME = 0.25
+# A case stops repeating measurements once it ran that long, after at least
+# MIN_REPEATS measurements
+MAX_TIME = 10.0
+MIN_REPEATS = 3
+# Cases reaching consensus in fewer frames are too short to time reliably,
+# and only their number of frames is compared
+MIN_FRAMES = 50
+# Generated layouts used by the suites, by short name
+GENERATED = {
+    'field200': ('open', 200, 200, 0.3),
+    'corridors400': ('corridors', 400, 100, 0.7),
+    'maze100': ('maze', 100, 100, 0.5),
+    'maze500': ('maze', 500, 500, 0.5),
+}
+
+def suite_cases(suite:str) -> list[dict]:
+    """Return the cases of a benchmark suite. Every case is a configuration
+    of Game with a fixed seed.
+
+    Generated layouts are written the first time they are used.
+
+    Args:
+        suite (str): 'quick' or 'full'
+
+    Returns:
+        list[dict]: name, seed and arguments of Game of every case
+    """
+    if suite == 'quick':
+        grid = [
+            ('bayesian', ['classic', 'line', 'open'], [25, 100], [2, 3], ['object']),
+            ('bayesian', ['open', 'maze100'], [1000], [2], ['numpy']),
+            ('benchmark', ['line'], [25], [2], ['numpy']),
+        ]
+    elif suite == 'full':
+        grid = [
+            ('bayesian', ['classic', 'line', 'open'], [25, 100, 500, 1000], [2, 3], ['object']),
+            ('bayesian', ['classic', 'line', 'open'], [25, 1000, 5000], [2, 3], ['numpy']),
+            ('bayesian', ['field200', 'corridors400', 'maze500'], [100, 1000], [2], ['object']),
+            ('bayesian', ['field200', 'corridors400', 'maze500'], [1000, 5000], [2, 3], ['numpy']),
+            ('benchmark', ['classic', 'line', 'open'], [25, 100], [2], ['object', 'numpy']),
+        ]
+    else:
+        raise ValueError('Invalid suite.')
+    cases = []
+    for algorithm, maps, ghosts, colours, engines in grid:
+        for map_name, n_ghosts, n_colours, engine in itertools.product(maps, ghosts, colours, engines):
+            ratio = [0.6] if n_colours == 2 else [0.5, 0.25]
+            cases.append({
+                'name': f'{algorithm}-{map_name}-{n_ghosts}-{n_colours}-{engine}',
+                'seed': 1,
+                'config': {
+                    'algorithm_id': 1 if algorithm == 'bayesian' else 2,
+                    'ratio': ratio,
+                    'map_name': write_layout(*GENERATED[map_name]) if map_name in GENERATED else map_name,
+                    'n_ghosts': n_ghosts,
+                    'n_colours': n_colours,
+                    'engine': engine,
+                },
+            })
+    return cases
+
+def measure(case:dict, repeats:int = 5) -> dict:
+    """Measure the frame rate and the time to consensus of a case. Every
+    measurement runs for at least MIN_TIME, repeating windows and runs that
+    end earlier, and is repeated with the same seed. The median of the
+    measurements is kept. Like timeit, the garbage collector is disabled
+    while measuring, so garbage left by earlier cases is not collected
+    during this one.
+
+    Args:
+        case (dict): name, seed and arguments of Game
+        repeats (int, optional): number of measurements, fewer once a case
+            ran for MAX_TIME. Defaults to 5.
+
+    Returns:
+        dict: frames per second over the first WINDOW frames, or until
+            consensus if it is reached earlier, frames and wall time to
+            consensus
+    """
+    game = Game(n_games=1, headless=True, verbose=False, **case['config'])
+    rates = []
+    wall_times = []
+    gc.collect()
+    collecting = gc.isenabled()
+    gc.disable()
+    started = time.perf_counter()
+    try:
+        while len(rates) < repeats:
+            frames = 0
+            elapsed = 0.0
+            while elapsed < MIN_TIME:
+                game.start_simulation(case['seed'])
+                game.running = True
+                window = 0
+                start = time.perf_counter()
+                while window < WINDOW and game.running:
+                    game.game_loop()
+                    window += 1
+                elapsed += time.perf_counter() - start
+                frames += window
+            rates.append(frames / elapsed)
+            runs = 0
+            elapsed = 0.0
+            while elapsed < MIN_TIME:
+                result, = game.play(case['seed'])
+                elapsed += result['wall_time']
+                runs += 1
+            wall_times.append(elapsed / runs)
+            if len(rates) >= MIN_REPEATS and time.perf_counter() - started > MAX_TIME:
+                break
+    finally:
+        if collecting:
+            gc.enable()
+    return {'fps': statistics.median(rates), 'frames': result['frames'], 'wall_time': statistics.median(wall_times)}
+
+def compare(results:dict, baseline:dict, tolerance:float) -> list[str]:
+    """Compare results with a baseline. Cases reaching consensus in fewer
+    than MIN_FRAMES frames are only compared by their number of frames.
+
+    Args:
+        results (dict): measurements of every case
+        baseline (dict): measurements of every case in the baseline
+        tolerance (float): relative slowdown allowed, e.g. 0.1 for 10%
+
+    Returns:
+        list[str]: description of every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result['frames'] != base['frames']:
+            regressions.append(f'{name}: {result["frames"]} frames to consensus instead of {base["frames"]}')
+        if base['frames'] < MIN_FRAMES:
+            continue
+        if result['fps'] < base['fps'] * (1 - tolerance):
+            regressions.append(f'{name}: {result["fps"]:.1f} fps instead of {base["fps"]:.1f}')
+        if result['wall_time'] > base['wall_time'] * (1 + tolerance):
+            regressions.append(f'{name}: {result["wall_time"]:.3f} s to consensus instead of {base["wall_time"]:.3f}')
+    return regressions
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description='Measure the frame rate and time to consensus of fixed configurations')
+    parser.add_argument('--suite', required=False, default='quick', choices=['quick', 'full'],
+                        help="Set of cases to run")
+    parser.add_argument('--filter', required=False, default='',
+                        metavar="text",
+                        help="Only run cases whose name contains the text, e.g. numpy")
+    parser.add_argument('--repeats', required=False, type=int, default=5,
+                        metavar="repetitions",
+                        help="Number of times every case is measured, e.g. 5")
+    parser.add_argument('--save', required=False,
+                        metavar="baseline file",
+                        help="Save the results as a baseline, e.g. baseline.json")
+    parser.add_argument('--compare', required=False,
+                        metavar="baseline file",
+                        help="Compare the results with a baseline, e.g. baseline.json")
+    parser.add_argument('--tolerance', required=False, type=float, default=0.1,
+                        metavar="tolerance",
+                        help="Relative slowdown allowed before a case is a regression, e.g. 0.1")
+
+    args = parser.parse_args()
+    results = {}
+    for case in suite_cases(args.suite):
+        if args.filter not in case['name']:
+            continue
+        results[case['name']] = measure(case, args.repeats)
+        result = results[case['name']]
+        print(f'{case["name"]:40} {result["fps"]:10.1f} fps {result["frames"]:8} frames {result["wall_time"]:8.3f} s')
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(),
+                'cases': results}, file, indent=4)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline['cases'], args.tolerance)
+        for regression in regressions:
+            print('Regression:', regression)
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
@@ -0,0 +1,39 @@
+import os
+import pickle
+
+# Version of the checkpoint format, checked when a checkpoint is loaded
+VERSION = 2
+
+def save_checkpoint(path:str, state:dict) -> None:
+    """Write a checkpoint atomically. The state is written to a temporary
+    file that replaces the previous checkpoint once it is on disk, so a job
+    killed while writing keeps its previous checkpoint.
+
+    Args:
+        path (str): path of the checkpoint file
+        state (dict): state of the simulation
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f'{path}.{os.getpid()}'
+    with open(temporary, 'wb') as file:
+        pickle.dump({'version': VERSION, **state}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+def load_checkpoint(path:str) -> dict:
+    """Read a checkpoint written by save_checkpoint.
+
+    Args:
+        path (str): path of the checkpoint file
+
+    Returns:
+        dict: state of the simulation
+    """
+    with open(path, 'rb') as file:
+        state = pickle.load(file)
+    if state.get('version') != VERSION:
+        raise ValueError(f'{path} is not a checkpoint of this version')
+    return state
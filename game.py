@@ -1,22 +1,26 @@
-import pygame
 import sys
 import random
-import matplotlib.pyplot as plt
+from array import array
 import numpy as np
-from statistics import mean
-from ghosts import GhostAgent
+from checkpoint import load_checkpoint, save_checkpoint
+from ghosts import Actions, GhostAgent
+from runner import run_rows
+from results import ResultStore, Summary, plot_results, read_results
+from profiling import profiler
+from tracing import TraceWriter
+from spatial import SpatialHash
+from swarm import Swarm
+from layout import load_layout
 from algorithms import *
 from settings import *
 import os
-
-# Initiate Pygame module
-pygame.init()
+import time
 
 class Game:
     """
     Game simulates the environment and displays it in the screen
     """
-    def __init__(self, algorithm_id:int, ratio: list, map_name:str, n_ghosts:int, n_games:int, n_colours:int) -> None:
+    def __init__(self, algorithm_id:int, ratio: list, map_name:str, n_ghosts:int, n_games:int, n_colours:int, headless: bool = False, engine: str = 'object', radius: float = COMMUNICATION_RADIUS, workers: int = 1, seed: int = None, verbose: bool = True, batch: int = 1, render_every: int = 1, fps: float = None, posterior: float = 0.99, prior = 1, positive_feedback: bool = True, simultaneous: bool = False, output: str = 'results.jsonl', profile: bool = False, trace: str = None, checkpoint: str = None, checkpoint_every: float = 60.0, resume: bool = False, telemetry: int = None) -> None:
         """Create game object
 
         Args:
@@ -29,6 +33,57 @@ class Game:
             n_ghosts (int): Number of agents
             n_games (int): Number of simulations
             n_colours (int): Number of colours tiles will be coloured with
+            headless (bool, optional): run without a display, event polling
+                or frame-rate cap. Defaults to False.
+            engine (str, optional): 'object' simulates every agent as a
+                GhostAgent, 'numpy' simulates the whole swarm as arrays.
+                The NumPy engine only runs headless. Defaults to 'object'.
+            radius (float, optional): communication radius in pixels.
+                Defaults to COMMUNICATION_RADIUS.
+            workers (int, optional): number of processes runs are spread
+                over. More than one worker only runs headless. Defaults to 1.
+            seed (int, optional): master seed the seed of every run is derived
+                from. A random seed is drawn if None. Defaults to None.
+            verbose (bool, optional): print the configuration. Defaults to True.
+            batch (int, optional): number of runs the NumPy engine simulates
+                together. Defaults to 1.
+            render_every (int, optional): draw only every K-th frame.
+                Defaults to 1.
+            fps (float, optional): draw at most this many frames per second.
+                Defaults to None. When both render_every and fps keep their
+                defaults, every frame is drawn and the simulation is capped at
+                10 frames per second; otherwise the simulation runs as fast
+                as possible between drawn frames.
+            posterior (float, optional): credible threshold of the Bayesian
+                algorithm. Defaults to 0.99.
+            prior (int, optional): prior of alpha and beta of the Bayesian
+                algorithm. Defaults to 1.
+            positive_feedback (bool, optional): Bayesian agents broadcast
+                their decision. Defaults to True.
+            simultaneous (bool, optional): Bayesian agents decide on all
+                colours at once from the same observations, instead of one
+                colour after the other with a reset in between. Defaults to
+                False.
+            output (str, optional): JSON Lines file the result of every run
+                is appended to. Defaults to 'results.jsonl'.
+            profile (bool, optional): time every phase of the game loop and
+                count costly operations, and add a summary to the result of
+                every run. Defaults to False.
+            trace (str, optional): directory the positions, decisions and
+                communication of every frame of every run are written to,
+                in a file named after the seed of the run. Defaults to None.
+            checkpoint (str, optional): file the state of the simulation is
+                saved to, after every run and every checkpoint_every seconds
+                of a run. Defaults to None.
+            checkpoint_every (float, optional): seconds between checkpoints
+                during a run. Defaults to 60.0.
+            resume (bool, optional): continue from the checkpoint if it
+                exists. Runs that ended are not simulated again and the run
+                that was interrupted continues where it was saved. Defaults
+                to False.
+            telemetry (int, optional): port on localhost the progress of the
+                job is served on as JSON, 0 for any free port. Defaults to
+                None, no server.
         """        
         self.ratio = ratio
         self.n_games = n_games
@@ -37,21 +92,73 @@ class Game:
         self.map_name = map_name
         self.map = Map(map_name, ratio)
         self.algorithm_id = algorithm_id
-
-        # Building the map
-        cols, rows = self.map.size()
-        SCREEN_WIDTH = cols * CELL_WIDTH
-        SCREEN_HEIGHT = rows * CELL_HEIGHT
-
-        # Pygame settings
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.clock = pygame.time.Clock()
+        self.headless = headless
+        self.engine = engine
+        self.radius = radius
+        self.workers = workers
+        self.batch = batch
+        self.render_every = render_every
+        self.fps = fps
+        self.lockstep = render_every == 1 and fps is None
+        self.posterior = posterior
+        self.prior = prior
+        self.positive_feedback = positive_feedback
+        self.simultaneous = simultaneous
+        self.output = output
+        self.profile = profile
+        self.trace = trace
+        self.tracer = None
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.done = {}
+        self.resumed = None
+        self.last_render = 0
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
         self.running = True
-        pygame.display.set_caption('Ghosts')
-        self.load_icon()
+        self.aborted = False
+
+        if self.engine not in ('object', 'numpy'):
+            raise ValueError('Invalid engine.')
+        if self.engine == 'numpy' and not self.headless:
+            raise ValueError('The NumPy engine only runs headless')
+        if self.batch > 1 and self.engine != 'numpy':
+            raise ValueError('Only the NumPy engine simulates runs in batches')
+        if self.workers > 1 and not self.headless:
+            raise ValueError('Parallel runs only run headless')
+        if self.simultaneous and self.algorithm_id != 1:
+            raise ValueError('Only the Bayesian algorithm decides on all colours at once')
+        if self.trace and self.batch > 1:
+            raise ValueError('Traces are only recorded for single runs')
+        if resume and not self.checkpoint:
+            raise ValueError('Resuming requires a checkpoint file')
+        if self.checkpoint and self.trace:
+            raise ValueError('Traces are not resumed from checkpoints')
+        if resume and os.path.exists(self.checkpoint):
+            self.resume_checkpoint(seed)
+        self.telemetry = None
+        if telemetry is not None:
+            from telemetry import Telemetry
+            self.telemetry = Telemetry(telemetry, n_runs=self.n_games, config=self.config())
+
+        if not self.headless:
+            # Building the map
+            cols, rows = self.map.size()
+            SCREEN_WIDTH = cols * CELL_WIDTH
+            SCREEN_HEIGHT = rows * CELL_HEIGHT
+
+            # pygame is only imported and initialised when the game is drawn
+            import pygame
+            from renderer import Renderer
+            pygame.init()
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.clock = pygame.time.Clock()
+            pygame.display.set_caption('Ghosts')
+            self.load_icon()
+            self.renderer = Renderer(self.screen, self.map)
 
         # Start simulation
-        self.print_configurations()
+        if verbose:
+            self.print_configurations()
         #self.start_simulation()
         
     def print_configurations(self) -> None:
@@ -60,81 +167,441 @@ class Game:
         print("\nSimulation Configuration ")
         print("=========================")
         print("Algorithm:", self.get_algorithm())
+        print("Engine: ", self.engine)
         print("Map name: ", self.map_name)
         print("Number of runs: ", self.n_games)
         print("Number of colours: ", self.n_colours)
         print("Ratio: ", self.ratio)
         print('Number of agents: ', self.n_ghosts)
+        if self.algorithm_id == 1:
+            print('Posterior: ', self.posterior)
+            print('Prior: ', self.prior)
+            print('Positive feedback: ', self.positive_feedback)
+            print('Simultaneous colours: ', self.simultaneous)
+        print('Communication radius: ', self.radius)
+        print('Workers: ', self.workers)
+        print('Batch size: ', self.batch)
+        print('Seed: ', self.seed)
+        print('Profiling: ', self.profile)
+        if self.checkpoint:
+            print('Checkpoint: ', self.checkpoint)
+            print('Runs resumed: ', len(self.done))
+        if self.telemetry is not None:
+            print('Telemetry: ', f'http://127.0.0.1:{self.telemetry.port}/')
     
-    def get_algorithm(self) -> BayesianAlgorithm | BenchmarkAlgorithm:
+    def get_algorithm(self, id:int = 0) -> BayesianAlgorithm | BenchmarkAlgorithm:
         """Get algorithm according to its id
 
+        Args:
+            id (int, optional): id of the agent running the algorithm.
+                Defaults to 0.
+
         Returns:
             BayesianAlgorithm | BenchmarkAlgorithm: return algorithm object
         """        
         if self.algorithm_id == 1:
-            return BayesianAlgorithm()
+            if self.simultaneous:
+                return MultiColourAlgorithm(self.n_colours, self.posterior, self.prior, self.positive_feedback)
+            return BayesianAlgorithm(self.posterior, self.prior, self.positive_feedback)
         elif self.algorithm_id == 2:
-            return BenchmarkAlgorithm(self.n_ghosts)
+            return BenchmarkAlgorithm(self.n_ghosts, id)
         
-    def start_simulation(self) -> None:
+    def config(self) -> dict:
+        """Return the arguments needed to create the same game in another process.
+
+        Returns:
+            dict: arguments of Game, without n_games and headless
+        """        
+        return {
+            'algorithm_id': self.algorithm_id,
+            'ratio': self.ratio,
+            'map_name': self.map_name,
+            'n_ghosts': self.n_ghosts,
+            'n_colours': self.n_colours,
+            'engine': self.engine,
+            'radius': self.radius,
+            'posterior': self.posterior,
+            'prior': self.prior,
+            'positive_feedback': self.positive_feedback,
+            'simultaneous': self.simultaneous,
+            'profile': self.profile,
+            'trace': self.trace,
+        }
+
+    def start_simulation(self, seed: int = None) -> None:
         """Start simulation. It set the map colours and create agents.
+
+        Args:
+            seed (int, optional): seed of the random generators.
+                Defaults to None.
         """        
+        if seed is not None:
+            random.seed(seed)
+        self.run_seed = seed
         self.frame = 0
+        self.messages = 0
         self.decision = False
         self.map.reset_colours()
-        self.all_sprites = pygame.sprite.Group()
-        self.add_ghosts()
+        self.ghosts = []
+        self.all_sprites = self.sprite_group()
+        self.neighbours = SpatialHash(self.radius)
+        if self.engine == 'numpy':
+            rng = np.random.default_rng(random.getrandbits(64))
+            self.swarm = Swarm(self.algorithm_id, self.map, self.n_ghosts, self.n_colours, self.radius,
+                self.posterior, self.prior, self.positive_feedback, self.simultaneous, rng=rng)
+        else:
+            self.add_ghosts()
+        if not self.headless:
+            self.renderer.reset()
         self.colour_count = 0
         self.reset_ghosts = False
+        if self.trace:
+            self.open_trace(seed)
+
+    def open_trace(self, seed: int = None) -> None:
+        """Start the trace of a run. The header holds the map, the
+        configuration, the seed and the colour of every agent of the object
+        engine, followed by the colour of every tile.
+
+        Args:
+            seed (int, optional): seed of the run. Defaults to None.
+        """
+        cols, rows = self.map.size()
+        header = {'map_name': self.map_name, 'size': [cols, rows], 'seed': seed,
+            'config': self.config(), 'colours': [list(colour) for colour in COLOURS[:self.n_colours]]}
+        path = os.path.join(self.trace, f'{seed}.trace')
+        agent_colours = None
+        if self.engine == 'object':
+            agent_colours = [AGENTS_COLOURS.index(ghost.colour) for ghost in self.ghosts]
+        self.tracer = TraceWriter(path, self.n_ghosts, header, self.map.tile_colours, agent_colours)
+        self.contacts = np.zeros(self.n_ghosts, dtype=np.uint16)
+        if self.engine == 'numpy':
+            self.swarm.count_contacts = True
+
+    def record(self) -> None:
+        """Write the positions, decisions and contacts of the agents at the
+        current frame to the trace.
+        """
+        if self.engine == 'numpy':
+            self.tracer.write(self.swarm.pos[0], self.swarm.decision[0], self.swarm.contacts[0])
+            return
+        pos = [ghost.pos for ghost in self.ghosts]
+        decision = [ghost.algorithm.decision for ghost in self.ghosts]
+        self.tracer.write(pos, decision, self.contacts)
+
+    def resume_checkpoint(self, seed: int = None) -> None:
+        """Load the checkpoint to resume from.
+
+        Args:
+            seed (int, optional): master seed given to the game. Defaults to
+                None, the master seed of the checkpoint.
+        """
+        state = load_checkpoint(self.checkpoint)
+        if state['config'] != self.config() or seed not in (None, state['seed']):
+            raise ValueError('The checkpoint is of another configuration or seed')
+        self.seed = state['seed']
+        self.done = state['done']
+        self.resumed = state['run']
+
+    def write_checkpoint(self, run: dict = None) -> None:
+        """Save the results of the runs that ended and the state of the
+        current run.
+
+        Args:
+            run (dict, optional): state of the current run, None between
+                runs. Defaults to None.
+        """
+        save_checkpoint(self.checkpoint, {'config': self.config(), 'seed': self.seed,
+            'done': self.done, 'run': run})
+        self.last_checkpoint = time.perf_counter()
+
+    def run_state(self) -> dict:
+        """Return the state of the current run between two frames: the
+        random generators, tile colours, agents, frame counter and profile.
+
+        Returns:
+            dict: state of the run
+        """
+        state = {'seed': self.run_seed, 'frame': self.frame, 'decision': self.decision,
+            'colour_count': self.colour_count, 'reset_ghosts': self.reset_ghosts,
+            'tile_colours': self.map.tile_colours, 'random': random.getstate(),
+            'wall_time': time.perf_counter() - self.started,
+            'profile': {name: getattr(profiler, name) for name in ('frames', 'totals', 'peaks', 'counts')}}
+        if self.engine == 'numpy':
+            state['swarm'] = self.swarm
+        else:
+            # Pickled together, so the spatial index keeps the same agents
+            state['ghosts'] = self.ghosts
+            state['neighbours'] = self.neighbours
+        return state
+
+    def restore_run(self, state: dict) -> None:
+        """Continue a run from the state returned by run_state.
+
+        Args:
+            state (dict): state of the run
+        """
+        random.setstate(state['random'])
+        self.run_seed = state['seed']
+        self.frame = state['frame']
+        self.messages = 0
+        self.decision = state['decision']
+        self.colour_count = state['colour_count']
+        self.reset_ghosts = state['reset_ghosts']
+        self.map.set_colours(state['tile_colours'])
+        self.ghosts = []
+        self.all_sprites = self.sprite_group()
+        if self.engine == 'numpy':
+            self.swarm = state['swarm']
+            self.swarm.restore(self.map)
+        else:
+            self.ghosts = state['ghosts']
+            self.neighbours = state['neighbours']
+            for ghost in self.ghosts:
+                ghost.map = self.map
+                ghost.index = self.neighbours
+                if not self.headless:
+                    from renderer import GhostSprite
+                    ghost.sprite = GhostSprite(ghost)
+                    self.all_sprites.add(ghost.sprite)
+        if not self.headless:
+            self.renderer.reset()
+        self.started = time.perf_counter() - state['wall_time']
+        for name, value in state['profile'].items():
+            setattr(profiler, name, value)
+
+    def sprite_group(self):
+        """Return an empty group for the sprites of the agents, or None when
+        the game runs headless.
+
+        Returns:
+            pygame.sprite.Group: group of sprites
+        """
+        if self.headless:
+            return None
+        import pygame
+        return pygame.sprite.Group()
 
     def load_icon(self) -> None:
         """Load icon image
         """        
-        self.icon = pygame.image.load('.\images\icon.jpg').convert_alpha()
+        import pygame
+        self.icon = pygame.image.load(os.path.join('images', 'icon.jpg')).convert_alpha()
         self.icon = pygame.transform.scale(self.icon, (30, 30))
         pygame.display.set_icon(self.icon)
 
     def run(self) -> None:
-        """Runs the application.
+        """Runs the application. The result of every run is appended to the
+        output file as soon as the run ends. When a display is used, the
+        runs are plotted afterwards by reading them back from that file.
         """        
-        total_avg = 0
-        accuracies = []
-        times = []
-        self.count = self.n_games
-        while self.count:
-            self.start_simulation()
-            self.running = True
-            self.count -=1 
-            while self.running:
-                self.game_loop()
-            
-            accuracy = self.get_average_accuracy()
-            total_avg += accuracy
-            accuracies.append(accuracy)
-            times.append(self.frame)
-            print('Simulation',len(times), 'has ended')
-        
-        self.plot_results(times, accuracies)
-        pygame.quit()
+        summary = Summary()
+        stored = set()
+        if self.done and os.path.exists(self.output):
+            stored = {row['run'] for row in read_results(self.output, self.seed, self.config())}
+        with ResultStore(self.output) as store:
+            # Runs saved in the checkpoint just before the job was killed may
+            # not have reached the output
+            for run, row in sorted(self.done.items()):
+                if run not in stored:
+                    store.append(row)
+                summary.add(row)
+            for row in self.results():
+                store.append(row)
+                summary.add(row)
+        summary.print()
+        if not self.headless:
+            import pygame
+            plot_results(read_results(self.output, self.seed, self.config()))
+            pygame.quit()
         sys.exit()
 
+    def results(self):
+        """Runs all simulations and yields the result of every run as it
+        ends. Each run is seeded with a seed derived from the master seed, so
+        results are the same with any number of workers. With a checkpoint,
+        runs that ended before are skipped and the checkpoint is saved
+        before every result is yielded. Closing the window stops the runs,
+        and the interrupted run is neither yielded nor saved as ended. The
+        telemetry server is closed when the runs end.
+
+        Yields:
+            dict: configuration, master seed, run, frames, accuracy,
+                decisions per colour and wall time of the run
+        """
+        config = self.config()
+        task = None if self.workers > 1 else lambda config, seed, n_runs: self.play(seed, n_runs)
+        if self.telemetry is not None:
+            for row in self.done.values():
+                self.telemetry.add(row)
+        try:
+            for row in run_rows(config, self.n_games, self.workers, self.seed, self.batch, task, self.done):
+                if self.aborted:
+                    return
+                row = {'config': config, **row}
+                if self.checkpoint:
+                    self.done[row['run']] = row
+                    self.write_checkpoint()
+                if self.telemetry is not None:
+                    self.telemetry.add(row)
+                yield row
+        finally:
+            # The server only serves the job while it runs
+            if self.telemetry is not None:
+                self.telemetry.close()
+
+    def run_simulations(self) -> tuple[list[int], list[float]]:
+        """Runs all simulations and returns their results without storing,
+        plotting or exiting. Runs resumed from a checkpoint are included.
+
+        Returns:
+            tuple[list[int], list[float]]: frames and average accuracy of
+                each run
+        """        
+        times = [0] * self.n_games
+        accuracies = [0.0] * self.n_games
+        for row in [*self.done.values(), *self.results()]:
+            times[row['run']] = row['frames']
+            accuracies[row['run']] = row['accuracy']
+        return times, accuracies
+
+    def play(self, seed: int, n_runs: int = 1) -> list[dict]:
+        """Runs a single simulation, or a batch of them with the NumPy
+        engine, and measures it.
+
+        Args:
+            seed (int): seed of the run or batch
+            n_runs (int, optional): number of runs in the batch. Defaults to 1.
+
+        Returns:
+            list[dict]: frames, accuracy, decisions per colour and wall time
+                of each run, and aborted if the window was closed before
+                the run ended. Runs of a batch share its wall time equally.
+                When profiling, the first run also holds the profile of the
+                run or of the whole batch.
+        """
+        profiler.enabled = self.profile
+        profiler.reset()
+        start = time.perf_counter()
+        if n_runs == 1:
+            frames, accuracy = self.simulate(seed)
+            # A resumed run includes the time spent before the checkpoint
+            start = self.started
+            times, accuracies, decisions = [frames], [accuracy], [self.decision_counts()]
+        else:
+            times, accuracies, decisions = self.simulate_batch(n_runs, seed)
+        wall_time = (time.perf_counter() - start) / n_runs
+        results = [{'frames': times[run], 'accuracy': accuracies[run], 'decisions': decisions[run],
+            'wall_time': wall_time} for run in range(n_runs)]
+        if self.aborted:
+            results[0]['aborted'] = True
+        if self.profile:
+            results[0]['profile'] = {'runs': n_runs, **profiler.summary()}
+        profiler.enabled = False
+        return results
+
+    def simulate_batch(self, n_runs: int, seed: int = None) -> tuple[list[int], list[float], list[list[int]]]:
+        """Runs several simulations at once with the NumPy engine. Every run
+        has its own tile colours and ends when its agents have made a decision.
+
+        Args:
+            n_runs (int): number of runs simulated together
+            seed (int, optional): seed of the batch. Defaults to None.
+
+        Returns:
+            tuple[list[int], list[float], list[list[int]]]: frames, average
+                accuracy and decisions per colour of each run
+        """        
+        if seed is not None:
+            random.seed(seed)
+        self.map.reset_colours()
+        rng = np.random.default_rng(random.getrandbits(64))
+        swarm = Swarm(self.algorithm_id, self.map, self.n_ghosts, self.n_colours, self.radius,
+            self.posterior, self.prior, self.positive_feedback, self.simultaneous, rng=rng, n_runs=n_runs)
+        frames, accuracies, decisions = swarm.simulate()
+        return frames.tolist(), accuracies.tolist(), decisions.tolist()
+
+    def simulate(self, seed: int = None) -> tuple[int, float]:
+        """Runs a single simulation until all agents have made a decision.
+
+        With a checkpoint, the state of the run is saved every
+        checkpoint_every seconds, and a run interrupted after a checkpoint
+        continues from it.
+
+        Args:
+            seed (int, optional): seed of the run. Defaults to None.
+
+        Returns:
+            tuple[int, float]: number of frames and average accuracy
+        """        
+        if self.resumed is not None and self.resumed['seed'] == seed:
+            self.restore_run(self.resumed)
+            self.resumed = None
+        else:
+            self.start_simulation(seed)
+            self.started = time.perf_counter()
+        self.last_checkpoint = time.perf_counter()
+        self.running = True
+        while self.running:
+            self.game_loop()
+            if self.checkpoint and self.running and time.perf_counter() - self.last_checkpoint >= self.checkpoint_every:
+                self.write_checkpoint(self.run_state())
+        if self.tracer is not None:
+            self.tracer.close()
+            self.tracer = None
+        return self.frame, self.get_average_accuracy()
+
     def game_loop(self) -> None:
         """ 
-        Runs the game loop.
+        Runs the game loop. In headless mode nothing is drawn and the frame
+        rate is not capped. Otherwise events are polled every frame, but
+        frames are only drawn as often as render_every and fps allow.
         """
+        profiling = profiler.enabled
+        if profiling:
+            start = time.perf_counter()
         self.frame += 1
         self.events()
+        if profiling:
+            profiler.add('events', start)
         self.update()
-        self.draw()          
-        self.clock.tick(10)
+        if self.tracer is not None:
+            self.record()
+        if self.telemetry is not None:
+            self.telemetry.update(self.frame, self.progress)
+        if not self.headless and self.should_render():
+            if profiling:
+                start = time.perf_counter()
+            self.draw()          
+            if profiling:
+                profiler.add('draw', start)
+            if self.lockstep:
+                self.clock.tick(10)
+        profiler.end_frame()
+
+    def should_render(self) -> bool:
+        """Return true if the current frame should be drawn.
+
+        Returns:
+            bool: true if the frame is drawn
+        """        
+        if self.frame % self.render_every:
+            return False
+        if self.fps is not None:
+            now = time.perf_counter()
+            if now - self.last_render < 1 / self.fps:
+                return False
+            self.last_render = now
+        return True
 
     def events(self) -> None:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.running = False
-                self.count = 0
-        if self.decision and self.n_colours == 2:
+        if not self.headless:
+            import pygame
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+                    self.aborted = True
+        if self.decision and (self.n_colours == 2 or self.simultaneous):
             self.running = False
         elif self.decision and self.colour_count > self.n_colours - 2:
             self.running = False
@@ -147,30 +614,75 @@ class Game:
         Update all agents. If all agents have made a decision, the game is reset 
         and the next simulation starts. In an environment where there are more 
         than 2 colours, if all agents have made a decision the algorihtm is reset.
-        Check if they are close to other agents so they can communicate.
+        Check if they are close to other agents so they can communicate, using
+        the spatial index the agents update as they walk.
         """        
+        if self.engine == 'numpy':
+            self.swarm.step()
+            if self.reset_ghosts:
+                self.swarm.reset(self.colour_count)
+            self.decision = self.swarm.all_decided()
+            self.reset_ghosts = False
+            return
         self.decision = True
-        for s in self.all_sprites:
+        profiling = profiler.enabled
+        messages = 0
+        for s in self.ghosts:
             s.update()
             if self.reset_ghosts:
-                s.reset_algorithm(COLOURS[self.colour_count])
+                s.reset_algorithm(self.colour_count)
             if s.algorithm.decision == -1:
                 self.decision = False
-            collided_enemies = pygame.sprite.spritecollide(s, self.all_sprites, False, pygame.sprite.collide_circle_ratio(2.0))
-            if s in collided_enemies:
-                collided_enemies.remove(s)
-            for j in collided_enemies:
+            if profiling:
+                start = time.perf_counter()
+            neighbours = self.neighbours.query(s)
+            for j in neighbours:
                 s.broadcast(j)
+            messages += len(neighbours)
+            if self.tracer is not None:
+                self.contacts[s.id] = len(neighbours)
+            if profiling:
+                profiler.add('communication', start)
+                profiler.counts['broadcasts'] += len(neighbours)
+        self.messages += messages
         self.reset_ghosts = False
 
+    def progress(self) -> tuple[int, int]:
+        """Return the progress of the current run.
+
+        Returns:
+            tuple[int, int]: number of undecided agents and of messages
+                sent in the run, counted like the profiler's broadcasts
+        """
+        if self.engine == 'numpy':
+            return int(np.count_nonzero(self.swarm.decision == -1)), self.swarm.messages
+        return sum(1 for ghost in self.ghosts if ghost.algorithm.decision == -1), self.messages
+
     def draw(self) -> None:
         """
-        Draws the map and the agents into the screen
+        Draws the agents into the screen. The sprites follow their agents
+        only here, and the map is drawn once per run in the renderer's background.
         """        
-        self.screen.fill(BLACK)
-        self.draw_layout()
-        self.all_sprites.draw(self.screen)
-        pygame.display.update()
+        self.all_sprites.update()
+        self.renderer.draw(self.all_sprites)
+
+    def decision_counts(self) -> list[int]:
+        """
+        Count the agents that decided on each colour. In binary scenarios a
+        decision other than 0 is a decision for the majority colour.
+
+        Returns:
+            list[int]: number of agents per colour, in the order of COLOURS
+        """
+        if self.engine == 'numpy':
+            return self.swarm.decision_counts()[0].tolist()
+        count = [0] * self.n_colours
+        for i in self.ghosts:
+            if self.n_colours == 2:
+                count[1 if i.algorithm.decision == 0 else 0] += 1
+            else:
+                count[max(i.algorithm.pcs, key=i.algorithm.pcs.get)] += 1
+        return count
 
     def get_average_accuracy(self) -> float:
         """
@@ -180,69 +692,36 @@ class Game:
         Returns:
             float: average accuracy
         """        
-        if self.n_colours == 2:
-            decision_count = [0, 0]
-            for i in self.all_sprites:
-                if i.algorithm.decision == 0:
-                    decision_count[0] += 1
-                else:
-                    decision_count[1] += 1
-            avg = (decision_count[1]) / self.n_ghosts
-            return avg
-        else:
-            count = {WHITE: 0, GREY: 0, CORAL: 0}
-            for i in self.all_sprites:
-                count[max(i.algorithm.pcs, key=i.algorithm.pcs.get)] += 1
-            avg = count[WHITE] / self.n_ghosts
-            return avg
-
-    def plot_results(self, times, accuracies) -> None:
-        """Plot the results of all simulations
-
-        Args:
-            times (list[int]): total time of each run
-            accuracies (list[float]): average accuracy of each run
-        """        
-        x = np.array(times)
-        y = np.array(accuracies)
-        print('\nResults')
-        print('==========')
-        print("Average time: ", mean(times))
-        print("Average accuracy: ", mean(accuracies))
-        plt.scatter(x, y)
-        plt.xlabel('Frames', fontsize='12')
-        plt.ylabel('Accuracy', fontsize='12')
-        plt.show()
+        return self.decision_counts()[WHITE_INDEX] / self.n_ghosts
 
     def draw_layout(self) -> None:
         """
         Draw the map into the screen
         """        
-        rows, columns = self.map.size()
-        for x in range(rows):
-            for y in range(columns):
-                if self.map.is_wall(x,y):
-                    pygame.draw.rect(self.screen, NAVY, 
-                        (x*CELL_WIDTH, y*CELL_HEIGHT, 
-                        CELL_WIDTH - 1, CELL_HEIGHT-1), 0, 3)
-                elif self.map.is_tile(x,y):
-                        pygame.draw.rect(self.screen, 
-                            self.map.get_tile_colour(x,y),
-                            (x*CELL_WIDTH, y*CELL_HEIGHT,
-                            CELL_WIDTH - 1, CELL_HEIGHT-1), 0, 3)
+        self.renderer.draw_layout(self.screen)
 
     def add_ghosts(self):
         """
-        Create ghosts objects and add them to a SpriteGroup
+        Create ghosts objects and add them to the spatial index, and their
+        sprites to a SpriteGroup when the game is drawn. Every ghost gets its
+        own copy of its start position.
         """        
         for i in range(self.n_ghosts):
             colour = random.choice(AGENTS_COLOURS)
-            position = random.choice(self.map.tile_list)
-            ghost = GhostAgent(position, colour, self.map, self.get_algorithm())
-            self.all_sprites.add(ghost)
+            position = self.map.tiles[random.randrange(len(self.map.tiles))].tolist()
+            ghost = GhostAgent(position, colour, self.map, self.get_algorithm(i), render=not self.headless, id=i)
+            self.ghosts.append(ghost)
+            if ghost.sprite is not None:
+                self.all_sprites.add(ghost.sprite)
+            self.neighbours.insert(ghost)
+            ghost.index = self.neighbours
 
 class Map():
-    """Map object that represents the environment.
+    """Map object that represents the environment. The layout is compiled
+    once into arrays and no Python object is created per cell, so layouts
+    with millions of cells load quickly. Colours are indices in COLOURS:
+    tile_colours holds the colour of every tile, and colour_grid the colour
+    of every cell in one byte, with NO_COLOUR for walls.
     """
     def __init__(self, map_name:str, ratio:list[int]) -> None:
         """Creates map
@@ -251,88 +730,85 @@ class Map():
             map_name (str): name of the file
             ratio (list[int]): ratios of colour
         """        
-        self.grid = []
         self.build_map(map_name)
         self.set_tiles_colours(ratio)
-        self.create_tiles_walls(map_name)
         self.ratio = ratio
         self.map_name = map_name
     
     def build_map(self, layout) -> None:
-        """Read layout and create logical map.
+        """Load the compiled layout and create logical map.
 
         Args:
             layout (str): name of the file with the map's layout
         """        
-        rows = 0
-        cols = 0
-        self.tile_list = []
-        file_to_open = os.path.join('layouts', f'{layout}.lay')
-        with open(file_to_open, 'r') as file:
-            for y, line in enumerate(file):
-                rows += 1
-                cols = len(line)
-                for x,char in enumerate(line):
-                    if char == "*":
-                        self.tile_list.append([x, y])
-        self.grid = [[Tile() for j in range(rows)] for i in range(cols)]
-
-    def create_tiles_walls(self, layout:str) -> None:
-        """Create tiles and walls according to the layout file
-
-        Args:
-            layout (str): name of the file with the map's layout.
+        compiled = load_layout(layout)
+        self.walls = compiled.walls
+        self.tile_index = compiled.tile_index
+        self.tiles = compiled.tiles
+        self.rows = self.walls.shape[1]
+        # Flat bytes and int arrays, indexed by x * rows + y, are as fast as
+        # nested lists for single cell lookups and take 5 bytes per cell
+        self.wall_cells = np.ascontiguousarray(self.walls).tobytes()
+        self.tile_cells = array('i', np.ascontiguousarray(self.tile_index, dtype=np.intc).tobytes())
+        self.colour_grid = np.full(self.walls.shape, NO_COLOUR, dtype=np.uint8)
+        # Shares the grid's memory, indexed by x * rows + y
+        self.colour_cells = memoryview(self.colour_grid.reshape(-1))
+        self.build_navigation()
+
+    def build_navigation(self) -> None:
+        """Build the graph of legal moves in CSR form. The moves from cell
+        x * rows + y are nav_moves[nav_offsets[cell]:nav_offsets[cell + 1]],
+        indices into Actions.directions in that order, so an agent picks a
+        move with one random index and no list is built per step. Walls have
+        no moves. The arrays serve the NumPy engine, and nav_offset_cells
+        and nav_move_cells are copies for fast lookups from Python.
         """
-        file_to_open = os.path.join('layouts', f'{layout}.lay')
-        with open(file_to_open, 'r') as file:
-            for y, line in enumerate(file):
-                for x, char in enumerate(line):
-                    if char == "%":
-                        self.add_wall(x, y)
-                    elif char == "*":
-                        self.add_tile(x, y)
+        cols, rows = self.walls.shape
+        # Cells outside the map are walls
+        walls = np.ones((cols + 2, rows + 2), dtype=bool)
+        walls[1:-1, 1:-1] = self.walls
+        legal = np.stack([~walls[1+dx:1+dx+cols, 1+dy:1+dy+rows]
+            for dx, dy in Actions.directions], axis=-1)
+        legal = (legal & ~self.walls[..., None]).reshape(cols * rows, len(Actions.directions))
+        self.nav_degree = legal.sum(axis=1).astype(np.int32)
+        self.nav_offsets = np.zeros(cols * rows + 1, dtype=np.int32)
+        np.cumsum(self.nav_degree, out=self.nav_offsets[1:])
+        # Row-major nonzero lists every cell's moves in the order of Actions.directions
+        self.nav_moves = np.nonzero(legal)[1].astype(np.uint8)
+        self.nav_offset_cells = array('i', self.nav_offsets.astype(np.intc).tobytes())
+        self.nav_move_cells = self.nav_moves.tobytes()
 
     def reset_colours(self) -> None:
-        """Reset tile's colours.
+        """Reset tile's colours by shuffling them again, with a permutation
+        drawn from the random module's state.
         """        
-        self.set_tiles_colours(self.ratio)
-        self.create_tiles_walls(self.map_name)
+        rng = np.random.default_rng(random.getrandbits(64))
+        self.set_colours(rng.permutation(self.colours))
 
-    def set_tiles_colours(self, ratio: list[float])-> None:
-        """ Set colour for all tiles according to the ratio
+    def set_colours(self, tile_colours:np.ndarray) -> None:
+        """Set the colour of every tile, e.g. the colours of a recorded run.
 
         Args:
-            ratio (list[ratio]): list of ratios for colours
-        """        
-        n_tiles = len(self.tile_list)
-        n_colours = len(ratio) + 1
-        colour_tiles = [[]] * n_colours
-        for i in range(n_colours-1):
-            colour_ratio = n_tiles * ratio[i]
-            colour_tiles[i] = [COLOURS[i]] * round(colour_ratio)
-        colour_ratio = n_tiles * (1 - sum(ratio))
-        colour_tiles[n_colours-1] = [COLOURS[n_colours-1]] * round(colour_ratio)
-        self.colour_list = [item for sublist in colour_tiles for item in sublist]
-        random.shuffle(self.colour_list)
-    
-    def add_wall(self, x: int, y:int) -> None:
-        """Add wall to the map.
-
-        Args:
-            x (int): x-axis value
-            y (int): y-axis value
-        """        
-        self.grid[x][y] = Tile(wall=True)
+            tile_colours (np.ndarray): index in COLOURS of the colour of
+                every tile
+        """
+        self.tile_colours = np.asarray(tile_colours, dtype=np.uint8)
+        self.colour_grid[self.tiles[:, 0], self.tiles[:, 1]] = self.tile_colours
 
-    def add_tile(self, x:int, y:int) -> None:
-        """Add tile to the map.
+    def set_tiles_colours(self, ratio: list[float])-> None:
+        """ Set colour for all tiles according to the ratio. The last colour
+        takes the tiles left after rounding the others.
 
         Args:
-            x (int): x-axis value
-            y (int): y-axis value
+            ratio (list[ratio]): list of ratios for colours
         """        
-        colour = self.colour_list.pop()
-        self.grid[x][y] = Tile(colour=colour)
+        n_tiles = len(self.tiles)
+        n_colours = len(ratio) + 1
+        counts = [round(n_tiles * ratio[i]) for i in range(n_colours-1)]
+        counts.append(max(n_tiles - sum(counts), 0))
+        # Index in COLOURS of every tile, before shuffling
+        self.colours = np.repeat(np.arange(n_colours, dtype=np.uint8), counts)[:n_tiles]
+        self.reset_colours()
     
     def size(self) -> set:
         """Return the width and height of the map.
@@ -340,7 +816,7 @@ class Map():
         Returns:
              set(int): width and height
         """        
-        return len(self.grid), len(self.grid[0])
+        return self.walls.shape
     
     def is_wall(self, x:int, y:int) -> bool:
         """Return true if cell is a wall
@@ -352,7 +828,7 @@ class Map():
         Returns:
             bool: true if wall, false if not wall
         """        
-        return self.grid[x][y].is_wall()
+        return bool(self.wall_cells[x * self.rows + y])
     
     def is_tile(self, x:int, y: int) -> bool:
         """Return true if cell is a tile
@@ -364,11 +840,9 @@ class Map():
         Returns:
             bool: true if tile, false if not tile
         """             
-        if self.grid[x][y].get_colour():
-            return True
-        return False
+        return self.tile_cells[x * self.rows + y] >= 0
 
-    def get_tile_colour(self,x,y) -> set:
+    def get_tile_colour(self,x,y) -> int:
         """Get colour of a tile
 
         Args:
@@ -376,33 +850,7 @@ class Map():
             y (int): y-axis value
 
         Returns:
-            set(int): RGB value of the colour
-        """        
-        return self.grid[x][y].get_colour()
-
-class Tile():
-    """Represents a tile.
-    """    
-    def __init__(self, wall = False, colour=None):
-        """Create tile object
-
-        Args:
-            wall (bool, optional): set tile to a wall or not. Defaults to False.
-            colour (set(int), optional): RGB value of a colour. Defaults to None.
-        """        
-        self.wall = wall
-        self.colour = colour
-    def is_wall(self) -> bool:
-        """Return true if tile is a wall.
-
-        Returns:
-            bool: true if wall, false if not wall
-        """        
-        return self.wall
-    def get_colour(self) -> str:
-        """Return the tile colour
-
-        Returns:
-            str: RGB value
+            int: index in COLOURS of the colour, NO_COLOUR if the cell is
+                not a tile
         """        
-        return self.colour
\ No newline at end of file
+        return self.colour_cells[x * self.rows + y]
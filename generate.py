@@ -0,0 +1,162 @@
+import os
+import numpy as np
+from layout import layout_path
+
+# Kinds of layouts the generator builds
+KINDS = ('open', 'corridors', 'maze')
+
+def generate_walls(kind:str, width:int, height:int, density:float = 0.3, corridor:int = 3, seed:int = None) -> np.ndarray:
+    """Generate the walls of a layout surrounded by a border. Every cell that
+    is not a wall is a tile, and all tiles are connected.
+
+    'open' is a field with single-cell pillars on a fraction density of the
+    cells with even coordinates. 'corridors' are horizontal corridors of
+    width corridor, separated by walls of which a fraction density is kept
+    and at least one cell is open. 'maze' is a binary tree maze of which a
+    fraction density of the walls between cells is kept, so 1 is a perfect
+    maze and 0 an open field with pillars.
+
+    Args:
+        kind (str): 'open', 'corridors' or 'maze'
+        width (int): number of columns
+        height (int): number of rows
+        density (float, optional): fraction of walls kept. Defaults to 0.3.
+        corridor (int, optional): width of the corridors. Defaults to 3.
+        seed (int, optional): seed of the layout. Defaults to None.
+
+    Returns:
+        np.ndarray: true for every wall cell, indexed by [x, y]
+    """
+    if kind not in KINDS:
+        raise ValueError('Invalid layout kind.')
+    if width < 5 or height < 5:
+        raise ValueError('Layouts are at least 5 cells wide and high')
+    if not 0 <= density <= 1:
+        raise ValueError('Density must be between 0 and 1')
+    rng = np.random.default_rng(seed)
+    walls = np.zeros((width, height), dtype=bool)
+    x = np.arange(width)[:, None]
+    y = np.arange(height)[None, :]
+    interior = (x > 0) & (x < width - 1) & (y > 0) & (y < height - 1)
+
+    if kind == 'open':
+        # Pillars never touch each other, so they can not close off a tile
+        pillars = (x % 2 == 0) & (y % 2 == 0) & (x > 1) & (x < width - 2) & (y > 1) & (y < height - 2)
+        walls = pillars & (rng.random(walls.shape) < density)
+    elif kind == 'corridors':
+        if corridor < 1:
+            raise ValueError('Corridors are at least 1 cell wide')
+        rows = (y % (corridor + 1) == 0) & (y < height - 2)
+        walls = np.broadcast_to(rows, walls.shape) & (rng.random(walls.shape) < density)
+        # Every wall between corridors has at least one opening
+        lines = np.flatnonzero(rows[0, 1:]) + 1
+        walls[rng.integers(1, width - 1, size=lines.size), lines] = False
+    else:
+        # Cells at odd coordinates are carved towards east or south
+        walls = ~((x % 2 == 1) & (y % 2 == 1))
+        cells_x = np.arange(1, width - 1, 2)
+        cells_y = np.arange(1, height - 1, 2)
+        east = rng.random((cells_x.size, cells_y.size)) < 0.5
+        last_x = cells_x + 2 >= width - 1
+        last_y = cells_y + 2 >= height - 1
+        east[last_x, :] = False
+        east[:, last_y] = True
+        east[np.ix_(last_x, last_y)] = False
+        south = ~east
+        south[:, last_y] = False
+        gx, gy = np.meshgrid(cells_x, cells_y, indexing='ij')
+        walls[gx[east] + 1, gy[east]] = False
+        walls[gx[south], gy[south] + 1] = False
+        # Braid the maze by removing walls between cells
+        between = interior & ((x % 2) != (y % 2)) & walls & (x < cells_x[-1] + 1) & (y < cells_y[-1] + 1)
+        walls[between & (rng.random(walls.shape) >= density)] = False
+        # Columns or rows left over by an even size stay walls
+        walls[cells_x[-1] + 1:, :] = True
+        walls[:, cells_y[-1] + 1:] = True
+    return walls | ~interior
+
+def layout_text(walls:np.ndarray) -> str:
+    """Return the text of a layout, with '%' for walls and '*' for tiles.
+
+    Args:
+        walls (np.ndarray): true for every wall cell, indexed by [x, y]
+
+    Returns:
+        str: content of a layout file
+    """
+    chars = np.where(walls.T, ord('%'), ord('*')).astype(np.uint8)
+    lines = np.concatenate([chars, np.full((chars.shape[0], 1), ord('\n'), dtype=np.uint8)], axis=1)
+    return lines.tobytes().decode()[:-1]
+
+def layout_name(kind:str, width:int, height:int, density:float = 0.3, corridor:int = 3, seed:int = 0) -> str:
+    """Return the name of a generated layout, made of its parameters.
+
+    Args:
+        kind (str): 'open', 'corridors' or 'maze'
+        width (int): number of columns
+        height (int): number of rows
+        density (float, optional): fraction of walls kept. Defaults to 0.3.
+        corridor (int, optional): width of the corridors. Defaults to 3.
+        seed (int, optional): seed of the layout. Defaults to 0.
+
+    Returns:
+        str: name of the layout
+    """
+    name = f'gen_{kind}_{width}x{height}_d{density:g}_s{seed}'
+    return name + f'_c{corridor}' if kind == 'corridors' else name
+
+def write_layout(kind:str, width:int, height:int, density:float = 0.3, corridor:int = 3, seed:int = 0, name:str = None) -> str:
+    """Generate a layout and write it to the layouts directory, unless it was
+    written before. The layout is then loaded by name like any other layout.
+
+    Args:
+        kind (str): 'open', 'corridors' or 'maze'
+        width (int): number of columns
+        height (int): number of rows
+        density (float, optional): fraction of walls kept. Defaults to 0.3.
+        corridor (int, optional): width of the corridors. Defaults to 3.
+        seed (int, optional): seed of the layout. Defaults to 0.
+        name (str, optional): name of the layout. Defaults to a name made of
+            the parameters.
+
+    Returns:
+        str: name of the layout
+    """
+    name = name or layout_name(kind, width, height, density, corridor, seed)
+    path = layout_path(name)
+    if not os.path.exists(path):
+        text = layout_text(generate_walls(kind, width, height, density, corridor, seed))
+        temporary = f'{path}.{os.getpid()}'
+        with open(temporary, 'w') as file:
+            file.write(text)
+        os.replace(temporary, path)
+    return name
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Generate a large layout and write it to the layouts directory')
+    parser.add_argument("kind", choices=KINDS,
+                        help="Kind of layout")
+    parser.add_argument('--width', required=False, type=int, default=200,
+                        metavar="columns",
+                        help="Number of columns, e.g. 2000")
+    parser.add_argument('--height', required=False, type=int, default=200,
+                        metavar="rows",
+                        help="Number of rows, e.g. 2000")
+    parser.add_argument('--density', required=False, type=float, default=0.3,
+                        metavar="density",
+                        help="Fraction of walls kept, between 0 and 1, e.g. 0.5")
+    parser.add_argument('--corridor', required=False, type=int, default=3,
+                        metavar="corridor width",
+                        help="Width of corridors, e.g. 3")
+    parser.add_argument('--seed', required=False, type=int, default=0,
+                        metavar="seed",
+                        help="Seed of the layout, e.g. 42")
+    parser.add_argument('--name', required=False,
+                        metavar="name",
+                        help="Name of the layout, e.g. big_maze")
+
+    args = parser.parse_args()
+    print(write_layout(args.kind, args.width, args.height, args.density, args.corridor, args.seed, args.name))
@@ -1,15 +1,18 @@
-import pygame
 from settings import *
 import random
 from algorithms import BayesianAlgorithm
-import os
+from profiling import profiler
+import time
 
-class GhostAgent(pygame.sprite.Sprite):
-    """Class representing the agents. It is responsible for its own image and
-    movement. It is a subclass of pygame's Sprite.
+class GhostAgent:
+    """Class representing the agents. It only holds the simulation state:
+    position, direction, algorithm and the spatial index it is kept in. A
+    GhostSprite view draws it when the game is rendered.
 
     """    
-    def __init__(self, pos, colour='pink', wall_map = None, algorithm = None):
+    __slots__ = ('id', 'pos', 'direction', 'colour', 'algorithm', 'map', 'index', 'sprite')
+
+    def __init__(self, pos, colour='pink', wall_map = None, algorithm = None, render = True, id = 0):
         """Create GhostAgent object
 
         Args:
@@ -17,28 +20,50 @@ class GhostAgent(pygame.sprite.Sprite):
             colour (str, optional): agent's colour. Defaults to 'pink'.
             wall_map (object, optional): map indicating all tiles. Defaults to None.
             algorithm (object, optional): algorithm. Defaults to None.
+            render (bool, optional): create the agent's sprite view. Headless
+                agents have no sprite. Defaults to True.
+            id (int, optional): index of the agent in the game. Defaults to 0.
         """        
-        pygame.sprite.Sprite.__init__(self)
+        self.id = id
         self.pos = pos
         self.direction = (0,0)
         self.colour = colour
         self.algorithm = algorithm
         self.map = wall_map
-        self.update_colour()
-
+        self.index = None
+        self.sprite = None
+        if render:
+            # pygame is only imported when agents are drawn
+            from renderer import GhostSprite
+            self.sprite = GhostSprite(self)
 
     def __str__(self) -> str:
         return "Ghost " + self.colour
 
+    def __getstate__(self) -> dict:
+        # The map, the spatial index and the sprite are not pickled, the game
+        # sets them again
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ('map', 'index', 'sprite')}
+
+    def __setstate__(self, state:dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.map = None
+        self.index = None
+        self.sprite = None
+
     def get_next_move(self):
-        """Return a random move
+        """Return a random move, picked by index from the map's navigation
+        graph.
 
         Returns:
             set(int): direction
         """        
-        moves = self.get_possible_actions()
-        next_move = random.choice(moves)
-        return next_move
+        wall_map = self.map
+        cell = self.pos[0] * wall_map.rows + self.pos[1]
+        start = wall_map.nav_offset_cells[cell]
+        move = wall_map.nav_move_cells[start + random.randrange(wall_map.nav_offset_cells[cell + 1] - start)]
+        return Actions.directions[move]
 
     def update(self, reset=False):
         """Updates the agents. The agent moves, observes the tiles and update its
@@ -49,30 +74,36 @@ class GhostAgent(pygame.sprite.Sprite):
         """        
         if reset:
             self.reset_algorithm()
+        profiling = profiler.enabled
+        if profiling:
+            start = time.perf_counter()
         self.walk()
+        if profiling:
+            start = profiler.add('walk', start)
         x, y = self.pos
         C = self.map.get_tile_colour(x,y)
+        if profiling:
+            start = profiler.add('observe', start)
         self.algorithm.update(C)
-        if self.algorithm.decision != -1 and (self.colour != 'black' or self.colour != 'white'):
-            self.update_colour()
+        if profiling:
+            profiler.add('algorithm', start)
     
     def reset_algorithm(self, colour):
         """Reset its own algorithm with a new main colour.
 
         Args:
-            colour (set(str)): rgb value of a colour
+            colour (int): index of the colour in COLOURS
         """        
         self.algorithm.reset(colour)
-        self.update_colour()
 
     def walk(self):
-        """Walk in the map
+        """Walk in the map and update the agent's bucket in the spatial index.
         """        
         self.direction = self.get_next_move()
         self.pos[0] += self.direction[0]
         self.pos[1] += self.direction[1]
-        self.rect.x += (self.direction[0] * CELL_WIDTH)
-        self.rect.y += (self.direction[1] * CELL_HEIGHT)
+        if self.index is not None:
+            self.index.move(self)
     
     def get_possible_actions(self) -> list:
         """Returns all possible actions a agent can make.
@@ -80,13 +111,9 @@ class GhostAgent(pygame.sprite.Sprite):
         Returns:
             list: all possible directions agent can go.
         """        
-        possible = []
-        for vec in Actions.directions:
-            x = self.pos[0] + vec[0]
-            y = self.pos[1] + vec[1]
-            if not self.map.is_wall(x,y):
-                possible.append(vec)
-        return possible
+        cell = self.pos[0] * self.map.rows + self.pos[1]
+        moves = self.map.nav_move_cells[self.map.nav_offset_cells[cell]:self.map.nav_offset_cells[cell + 1]]
+        return [Actions.directions[move] for move in moves]
     
     def broadcast(self, ghost: object) -> None:
         """Broadcast observation/decision to another agent.
@@ -95,12 +122,9 @@ class GhostAgent(pygame.sprite.Sprite):
             ghost (GhostAgent): other agent
         """        
         if isinstance(self.algorithm, BayesianAlgorithm):
-            if self.algorithm.decision != -1 and self.algorithm.positive_feedback:
-                ghost.bayes_receive(self.algorithm.decision)
-            else:
-                ghost.bayes_receive(self.algorithm.last_C)
+            ghost.bayes_receive(self.algorithm.message())
         else:
-            ghost.bdm_receive(self, self.algorithm.alpha, self.algorithm.beta)
+            ghost.bdm_receive(self.id, self.algorithm.alpha, self.algorithm.beta)
 
 
     def bayes_receive(self, info):
@@ -112,37 +136,27 @@ class GhostAgent(pygame.sprite.Sprite):
         if info:
             self.algorithm.update_ratio(info)
     
-    def bdm_receive(self, id: object, alpha: int, beta: int) -> None:
+    def bdm_receive(self, id: int, alpha: int, beta: int) -> None:
         """Pass comunicated infomartion to Benchmark algorithm.
 
         Args:
-            id (GhostAgent): agent that sent the information
+            id (int): id of the agent that sent the information
             alpha (int): white observations
             beta (int): black observations
         """        
         self.algorithm.receive_info(id, alpha, beta)
 
-    def update_colour(self) -> None:
-        """Update agent's own image according to its decision.
+    def get_image_name(self) -> str:
+        """Return the name of the image matching the agent's decision.
+
+        Returns:
+            str: agent's own colour if undecided, 'black' or 'white' otherwise
         """        
-        if self.algorithm.decision == -1:
-            image = os.path.join('images', f'ghost_{self.colour}.png')
-            self.image = pygame.image.load(image).convert_alpha()
-            self.image = pygame.transform.scale(self.image, (CELL_WIDTH, CELL_HEIGHT))
-            self.rect = self.image.get_rect()
-            self.rect.center= (self.pos[0]*CELL_WIDTH+10,self.pos[1]*CELL_HEIGHT+10)
-        elif self.algorithm.decision == 0:
-            image = os.path.join('images', 'ghost_black.png')
-            self.image = pygame.image.load(image).convert_alpha()
-            self.image = pygame.transform.scale(self.image, (CELL_WIDTH, CELL_HEIGHT))
-            self.rect = self.image.get_rect()
-            self.rect.center= (self.pos[0]*CELL_WIDTH+10,self.pos[1]*CELL_HEIGHT+10)
+        if self.algorithm.decision == 0:
+            return 'black'
         elif self.algorithm.decision == 1:
-            image = os.path.join('images', 'ghost_white.png')
-            self.image = pygame.image.load(image).convert_alpha()
-            self.image = pygame.transform.scale(self.image, (CELL_WIDTH, CELL_HEIGHT))
-            self.rect = self.image.get_rect()
-            self.rect.center= (self.pos[0]*CELL_WIDTH+10,self.pos[1]*CELL_HEIGHT+10)
+            return 'white'
+        return self.colour
 
 class Actions:
     """
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import struct
+import zipfile
+import numpy as np
+
+class Layout:
+    """
+    Compiled layout. Holds a wall mask, the index of the tile in every cell
+    and the coordinates of every tile. Arrays are indexed by [x, y].
+    """
+    def __init__(self, walls:np.ndarray, tile_index:np.ndarray, tiles:np.ndarray) -> None:
+        """Create layout
+
+        Args:
+            walls (np.ndarray): true for every wall cell
+            tile_index (np.ndarray): index of the tile in every cell, -1 if
+                the cell is not a tile
+            tiles (np.ndarray): x and y of every tile, in reading order
+        """
+        self.walls = walls
+        self.tile_index = tile_index
+        self.tiles = tiles
+
+def layout_path(layout:str) -> str:
+    """Return the path of a layout file.
+
+    Args:
+        layout (str): name of the layout
+
+    Returns:
+        str: path of the text file
+    """
+    return os.path.join('layouts', f'{layout}.lay')
+
+def compile_layout(text:str) -> Layout:
+    """Compile the text of a layout. '%' are walls and '*' are tiles.
+
+    Args:
+        text (str): content of a layout file
+
+    Returns:
+        Layout: compiled layout
+    """
+    lines = text.splitlines()
+    cols = max(len(line.rstrip()) for line in lines)
+    chars = ''.join(line[:cols].ljust(cols) for line in lines).encode()
+    # Characters are read row by row, so tiles keep the reading order of the file
+    grid = np.frombuffer(chars, dtype=np.uint8).reshape(len(lines), cols)
+    tiles = np.argwhere(grid == ord('*'))[:, ::-1].astype(np.int32)
+    tile_index = np.full((cols, len(lines)), -1, dtype=np.int32)
+    tile_index[tiles[:, 0], tiles[:, 1]] = np.arange(len(tiles), dtype=np.int32)
+    return Layout(np.ascontiguousarray((grid == ord('%')).T), tile_index, np.ascontiguousarray(tiles))
+
+def load_layout(layout:str) -> Layout:
+    """Load a compiled layout. The layout is compiled once and stored as an
+    .npz next to the layout file, keyed by a hash of the file's content, so
+    editing the layout compiles it again.
+
+    Args:
+        layout (str): name of the layout
+
+    Returns:
+        Layout: compiled layout
+    """
+    with open(layout_path(layout), 'rb') as file:
+        content = file.read()
+    digest = hashlib.sha1(content).hexdigest()
+    cache = os.path.join('layouts', f'{layout}.npz')
+    try:
+        arrays = load_arrays(cache)
+        if str(arrays['digest']) == digest:
+            return Layout(arrays['walls'], arrays['tile_index'], arrays['tiles'])
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass
+    compiled = compile_layout(content.decode())
+    try:
+        temporary = f'{cache}.{os.getpid()}.npz'
+        np.savez(temporary, digest=digest, walls=compiled.walls,
+            tile_index=compiled.tile_index, tiles=compiled.tiles)
+        os.replace(temporary, cache)
+    except OSError:
+        pass
+    return compiled
+
+def load_arrays(path:str) -> dict:
+    """Load the arrays of an .npz file. Arrays that are stored uncompressed
+    are memory mapped, the others are read into memory.
+
+    Args:
+        path (str): path of the .npz file
+
+    Returns:
+        dict: arrays by name
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            array = None
+            if info.compress_type == zipfile.ZIP_STORED:
+                array = memory_map(path, info)
+            if array is None:
+                with archive.open(info) as file:
+                    array = np.lib.format.read_array(file)
+            arrays[name] = array
+    return arrays
+
+def memory_map(path:str, info:zipfile.ZipInfo):
+    """Memory map an array stored uncompressed in a zip file.
+
+    Args:
+        path (str): path of the zip file
+        info (zipfile.ZipInfo): entry of the array
+
+    Returns:
+        np.memmap | None: the array, None if it can not be memory mapped
+    """
+    with open(path, 'rb') as file:
+        file.seek(info.header_offset)
+        header = file.read(30)
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        file.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(file)
+        elif version == (2, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(file)
+        else:
+            return None
+        offset = file.tell()
+    if dtype.hasobject or not np.prod(shape):
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+        order='F' if fortran else 'C')
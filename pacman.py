@@ -6,7 +6,7 @@ if __name__ == '__main__':
     # Parse command line arguments
     parser = argparse.ArgumentParser(
         description='')
-    parser.add_argument("algorithm",
+    parser.add_argument("algorithm", nargs='?',
                         metavar="algorithm name",
                         help="'baeysian' or 'benchmark'")
     parser.add_argument("--n",
@@ -24,8 +24,78 @@ if __name__ == '__main__':
     parser.add_argument('--colours', required=False,
                         metavar="number of colours",
                         help="Number of Colours, e.g. 3")
+    parser.add_argument('--posterior', required=False, type=float, default=0.99,
+                        metavar="credible threshold",
+                        help="Credible threshold of the Bayesian algorithm, e.g. 0.95")
+    parser.add_argument('--prior', required=False, type=int, default=1,
+                        metavar="prior",
+                        help="Initial alpha and beta of the Bayesian algorithm, e.g. 2")
+    parser.add_argument('--no-feedback', action='store_true',
+                        help="Bayesian agents broadcast observations instead of decisions")
+    parser.add_argument('--simultaneous', action='store_true',
+                        help="Bayesian agents decide on all colours at once instead of one after the other")
+    parser.add_argument('--headless', action='store_true',
+                        help="Run without a display or frame-rate cap")
+    parser.add_argument('--render-every', required=False, type=int, default=1,
+                        metavar="frames per drawn frame",
+                        help="Draw only every K-th frame, e.g. 100")
+    parser.add_argument('--fps', required=False, type=float,
+                        metavar="drawn frames per second",
+                        help="Draw at most F frames per second, e.g. 30")
+    parser.add_argument('--engine', required=False, default='object',
+                        choices=['object', 'numpy'],
+                        help="'object' or 'numpy'. The NumPy engine runs headless")
+    parser.add_argument('--radius', required=False, type=float,
+                        default=COMMUNICATION_RADIUS,
+                        metavar="communication radius",
+                        help="Communication radius in pixels, e.g. 62.5")
+    parser.add_argument('--workers', required=False, type=int, default=1,
+                        metavar="number of workers",
+                        help="Number of processes runs are spread over, e.g. 8")
+    parser.add_argument('--batch', required=False, type=int, default=1,
+                        metavar="runs per batch",
+                        help="Number of runs the NumPy engine simulates together, e.g. 16")
+    parser.add_argument('--seed', required=False, type=int,
+                        metavar="master seed",
+                        help="Seed every run's seed is derived from, e.g. 42")
+    parser.add_argument('--profile', action='store_true',
+                        help="Time every phase of a frame and count costly operations")
+    parser.add_argument('--trace', required=False,
+                        metavar="trace directory",
+                        help="Directory a binary trace of every run is written to, e.g. traces")
+    parser.add_argument('--checkpoint', required=False,
+                        metavar="checkpoint file",
+                        help="File the state of the simulation is saved to, e.g. run.ckpt")
+    parser.add_argument('--checkpoint-every', required=False, type=float, default=60.0,
+                        metavar="seconds",
+                        help="Seconds between checkpoints during a run, e.g. 300")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue from the checkpoint if it exists")
+    parser.add_argument('--telemetry', required=False, type=int,
+                        metavar="port",
+                        help="Serve the progress of the job as JSON on localhost, e.g. 8765")
+    parser.add_argument('--replay', required=False,
+                        metavar="trace file",
+                        help="Play back a recorded trace instead of simulating, e.g. traces/42.trace")
+    parser.add_argument('--speed', required=False, type=float, default=10.0,
+                        metavar="frames per second",
+                        help="Recorded frames played back per second, e.g. 1000")
+    parser.add_argument('--start', required=False, type=int, default=0,
+                        metavar="frame",
+                        help="Frame playback starts at, e.g. 15000")
+    parser.add_argument('--output', required=False, default='results.jsonl',
+                        metavar="results file",
+                        help="JSON Lines file the result of every run is appended to, e.g. results.jsonl")
 
     args = parser.parse_args()
+
+    if args.replay:
+        from replay import Replay
+        if args.speed <= 0:
+            raise ValueError('Playback speed must be positive')
+        Replay(args.replay, args.speed, args.start).run()
+        sys.exit()
+
     game = None
     ratio = [0.55]
     map = 'classic'
@@ -48,6 +118,9 @@ if __name__ == '__main__':
             raise ValueError('Benchmark algorithm is used in Binary scenarios only')
         colours = int(args.colours)
     
+    if args.algorithm == "benchmark" and args.simultaneous:
+        raise ValueError('Only the Bayesian algorithm decides on all colours at once')
+
     if args.algorithm == "benchmark" and len(ratio) > 1:
         raise ValueError('Benchmark algorithm is used in Binary scenarios only')
     
@@ -60,9 +133,45 @@ if __name__ == '__main__':
     if args.ghosts:
         ghosts = int(args.ghosts)
 
+    if args.radius <= 0:
+        raise ValueError('Communication radius must be positive')
+
+    if args.workers < 1:
+        raise ValueError('Number of workers must be at least 1')
+
+    if not 0.5 < args.posterior < 1:
+        raise ValueError('Credible threshold must be between 0.5 and 1')
+
+    if args.prior < 1:
+        raise ValueError('Prior must be at least 1')
+
+    if args.render_every < 1:
+        raise ValueError('Frames per drawn frame must be at least 1')
+
+    if args.fps is not None and args.fps <= 0:
+        raise ValueError('Drawn frames per second must be positive')
+
+    if args.batch < 1:
+        raise ValueError('Batch size must be at least 1')
+
+    if args.checkpoint_every < 0:
+        raise ValueError('Seconds between checkpoints must not be negative')
+
+    if args.batch > 1 and args.engine != 'numpy':
+        raise ValueError('Only the NumPy engine simulates runs in batches')
+
+    headless = args.headless or args.engine == 'numpy' or args.workers > 1
+
+    options = dict(headless=headless, engine=args.engine, radius=args.radius,
+        workers=args.workers, seed=args.seed, batch=args.batch,
+        render_every=args.render_every, fps=args.fps, posterior=args.posterior,
+        prior=args.prior, positive_feedback=not args.no_feedback, simultaneous=args.simultaneous, output=args.output, profile=args.profile, trace=args.trace,
+        checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every, resume=args.resume,
+        telemetry=args.telemetry)
+
     if args.algorithm == "benchmark":
-        game = Game(2, ratio, map, ghosts, games, 2)
+        game = Game(2, ratio, map, ghosts, games, 2, **options)
         game.run()
     else:
-        game = Game(1, ratio, map, ghosts, games, colours)
+        game = Game(1, ratio, map, ghosts, games, colours, **options)
         game.run()
\ No newline at end of file
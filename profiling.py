@@ -0,0 +1,78 @@
+import time
+
+# Phases of a frame, in the order they run
+PHASES = ('events', 'walk', 'observe', 'algorithm', 'communication', 'draw')
+# Counted operations: CDF evaluations, messages sent between agents, agent
+# images changed, and candidate agents tested for being in range
+COUNTERS = ('cdf', 'broadcasts', 'colour_updates', 'collisions')
+
+class Profiler:
+    """
+    Records the time spent in every phase of the game loop and counts costly
+    operations. A disabled profiler costs a check of 'enabled' at every
+    instrumented place; the code checks it before reading the clock.
+    """
+    def __init__(self) -> None:
+        self.enabled = False
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all timings and counters. Called at the start of every run.
+        """
+        self.frames = 0
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.peaks = dict.fromkeys(PHASES, 0.0)
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def add(self, phase:str, start:float) -> float:
+        """Add the time since start to a phase of the current frame.
+
+        Args:
+            phase (str): name of the phase
+            start (float): time.perf_counter() when the phase started
+
+        Returns:
+            float: current time, the start of the next phase
+        """
+        now = time.perf_counter()
+        self.current[phase] += now - start
+        return now
+
+    def count(self, counter:str, n:int = 1) -> None:
+        """Count operations if the profiler is enabled.
+
+        Args:
+            counter (str): name of the counter
+            n (int, optional): number of operations. Defaults to 1.
+        """
+        if self.enabled:
+            self.counts[counter] += n
+
+    def end_frame(self) -> None:
+        """Add the timings of the current frame to the totals.
+        """
+        if not self.enabled:
+            return
+        self.frames += 1
+        for phase, elapsed in self.current.items():
+            self.totals[phase] += elapsed
+            if elapsed > self.peaks[phase]:
+                self.peaks[phase] = elapsed
+            self.current[phase] = 0.0
+
+    def summary(self) -> dict:
+        """Return the timings and counters of the run in a form that can be
+        written as JSON.
+
+        Returns:
+            dict: number of frames, total, mean and maximum seconds per frame
+                of every phase, and the counters
+        """
+        frames = max(self.frames, 1)
+        phases = {phase: {'total': self.totals[phase], 'mean': self.totals[phase] / frames,
+            'max': self.peaks[phase]} for phase in PHASES}
+        return {'frames': self.frames, 'phases': phases, 'counts': dict(self.counts)}
+
+# Profiler of this process, shared by the game, the agents and the swarm
+profiler = Profiler()
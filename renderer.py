@@ -0,0 +1,134 @@
+import os
+import pygame
+from profiling import profiler
+from settings import *
+
+# Scaled ghost images shared by all agents, by image name
+images = {}
+
+def load_image(name: str) -> pygame.Surface:
+    """Return the scaled image of a ghost. Images are loaded from disk once
+    per process and shared by all agents.
+
+    Args:
+        name (str): colour in the image's file name, e.g. 'pink'
+
+    Returns:
+        pygame.Surface: scaled image
+    """    
+    if name not in images:
+        image = pygame.image.load(os.path.join('images', f'ghost_{name}.png')).convert_alpha()
+        images[name] = pygame.transform.scale(image, (CELL_WIDTH, CELL_HEIGHT))
+    return images[name]
+
+class GhostSprite(pygame.sprite.Sprite):
+    """Sprite view of an agent, only created when the game is drawn. Its
+    image and rect follow the agent's decision and position when it is
+    updated, so agents are only read by the renderer at drawn frames.
+    """
+    def __init__(self, agent) -> None:
+        """Create the sprite of an agent
+
+        Args:
+            agent (GhostAgent): agent the sprite shows
+        """
+        pygame.sprite.Sprite.__init__(self)
+        self.agent = agent
+        self.image_name = None
+        self.update()
+
+    def update(self) -> None:
+        """Move the sprite to the agent's position and switch its image when
+        the agent's decision changed.
+        """
+        if self.image_name != self.agent.get_image_name():
+            self.update_colour()
+        self.rect.center = (self.agent.pos[0]*CELL_WIDTH+10, self.agent.pos[1]*CELL_HEIGHT+10)
+
+    def update_colour(self) -> None:
+        """Update the image according to the agent's decision, using the
+        shared image cache.
+        """        
+        profiler.count('colour_updates')
+        self.image_name = self.agent.get_image_name()
+        self.image = load_image(self.image_name)
+        self.rect = self.image.get_rect()
+
+class Renderer:
+    """
+    Draws the map once per run into a background surface. Every frame only
+    the areas of agents that moved or changed image are restored from the
+    background, the agents are drawn again and only those areas are updated
+    on the display.
+    """
+    def __init__(self, screen:pygame.Surface, wall_map) -> None:
+        """Create renderer
+
+        Args:
+            screen (pygame.Surface): display surface
+            wall_map (Map): map to draw
+        """
+        self.screen = screen
+        self.map = wall_map
+        self.background = pygame.Surface(screen.get_size())
+        self.drawn = {}
+
+    def reset(self) -> None:
+        """Draw the map into the background and the whole screen. Called at
+        the start of every run, after the tile colours changed.
+        """
+        self.background.fill(BLACK)
+        self.draw_layout(self.background)
+        self.screen.blit(self.background, (0, 0))
+        self.drawn = {}
+        pygame.display.update()
+
+    def draw_layout(self, surface:pygame.Surface) -> None:
+        """
+        Draw the map into a surface
+
+        Args:
+            surface (pygame.Surface): surface to draw on
+        """
+        rows, columns = self.map.size()
+        for x in range(rows):
+            for y in range(columns):
+                if self.map.is_wall(x,y):
+                    pygame.draw.rect(surface, NAVY,
+                        (x*CELL_WIDTH, y*CELL_HEIGHT,
+                        CELL_WIDTH - 1, CELL_HEIGHT-1), 0, 3)
+                elif self.map.is_tile(x,y):
+                        pygame.draw.rect(surface,
+                            COLOURS[self.map.get_tile_colour(x,y)],
+                            (x*CELL_WIDTH, y*CELL_HEIGHT,
+                            CELL_WIDTH - 1, CELL_HEIGHT-1), 0, 3)
+
+    def draw(self, sprites) -> None:
+        """Draw the agents that moved or changed image and update only the
+        areas of the display that changed.
+
+        Args:
+            sprites (pygame.sprite.Group): agents to draw
+        """
+        changed = []
+        dirty = []
+        for sprite in sprites:
+            previous = self.drawn.get(sprite)
+            if previous and previous[0] == sprite.rect and previous[1] is sprite.image:
+                continue
+            changed.append(sprite)
+            if previous:
+                self.screen.blit(self.background, previous[0], previous[0])
+                dirty.append(previous[0])
+        if not changed:
+            return
+        redraw = set(changed)
+        for sprite in sprites:
+            # Unchanged agents are only drawn again if an area under them was cleared
+            if sprite in redraw or sprite.rect.collidelist(dirty) != -1:
+                self.screen.blit(sprite.image, sprite.rect)
+        for sprite in changed:
+            rect = sprite.rect.copy()
+            self.drawn[sprite] = (rect, sprite.image)
+            dirty.append(rect)
+        pygame.display.update(dirty)
@@ -0,0 +1,169 @@
+import pygame
+import time
+from game import Map
+from renderer import GhostSprite, Renderer
+from tracing import TraceReader
+from settings import *
+
+class TracedAgent:
+    """
+    Agent of a recorded run. It only holds what a GhostSprite needs to draw
+    it: its position, decision and colour.
+    """
+    __slots__ = ('id', 'pos', 'decision', 'colour', 'sprite')
+
+    def __init__(self, id:int, colour:str) -> None:
+        """Create traced agent
+
+        Args:
+            id (int): index of the agent in the trace
+            colour (str): agent's colour, e.g. 'pink'
+        """
+        self.id = id
+        self.pos = [0, 0]
+        self.decision = -1
+        self.colour = colour
+        self.sprite = None
+
+    def get_image_name(self) -> str:
+        """Return the name of the image matching the agent's decision.
+
+        Returns:
+            str: agent's own colour if undecided, 'black' or 'white' otherwise
+        """
+        if self.decision == 0:
+            return 'black'
+        elif self.decision == 1:
+            return 'white'
+        return self.colour
+
+class Replay:
+    """
+    Plays back a trace recorded with Game(trace=...) without simulating. The
+    map and agents are drawn like a live game. Frames are read from the
+    memory-mapped trace only when they are shown, so playback at any speed
+    skips the frames in between, and seeking to any frame costs the same as
+    showing the next one.
+
+    Keys: space pauses, left and right step one frame, page up and page
+    down seek a tenth of the run, home and end seek to the first and last
+    frame, up and down double and halve the speed. Space at the last frame
+    plays the run again.
+    """
+    def __init__(self, path:str, speed:float = 10.0, start:int = 0, fps:float = 30) -> None:
+        """Open a trace and the display
+
+        Args:
+            path (str): path of the trace file
+            speed (float, optional): recorded frames played per second.
+                Defaults to 10.0, the frame rate of a live game.
+            start (int, optional): first frame shown. Defaults to 0.
+            fps (float, optional): frames drawn per second. Defaults to 30.
+        """
+        self.trace = TraceReader(path)
+        if not len(self.trace):
+            raise ValueError(f'{path} has no frames')
+        config = self.trace.header['config']
+        self.map = Map(config['map_name'], config['ratio'])
+        self.map.set_colours(self.trace.tile_colours)
+        self.speed = speed
+        self.fps = fps
+        self.paused = False
+        self.running = True
+        self.shown = None
+        self.seek(start)
+
+        cols, rows = self.map.size()
+        pygame.init()
+        self.screen = pygame.display.set_mode((cols * CELL_WIDTH, rows * CELL_HEIGHT))
+        self.clock = pygame.time.Clock()
+        self.renderer = Renderer(self.screen, self.map)
+        # Agents of the NumPy engine have no colours and get one in turn
+        colours = self.trace.agent_colours or [i % len(AGENTS_COLOURS) for i in range(self.trace.n_agents)]
+        self.agents = [TracedAgent(i, AGENTS_COLOURS[colour]) for i, colour in enumerate(colours)]
+        for agent in self.agents:
+            agent.sprite = GhostSprite(agent)
+        self.all_sprites = pygame.sprite.Group([agent.sprite for agent in self.agents])
+
+    def seek(self, frame:float) -> None:
+        """Move playback to a frame, clamped to the frames of the trace.
+
+        Args:
+            frame (float): index of the frame
+        """
+        self.position = min(max(frame, 0), len(self.trace) - 1)
+
+    def frame(self) -> int:
+        """Return the index of the frame at the current playback position.
+
+        Returns:
+            int: index of the frame
+        """
+        return int(self.position)
+
+    def run(self) -> None:
+        """Play the trace until the window is closed. Playback pauses at the
+        last frame.
+        """
+        self.renderer.reset()
+        last = time.perf_counter()
+        while self.running:
+            self.events()
+            now = time.perf_counter()
+            if not self.paused:
+                self.seek(self.position + self.speed * (now - last))
+                if self.frame() == len(self.trace) - 1:
+                    self.paused = True
+            last = now
+            self.show(self.frame())
+            self.clock.tick(self.fps)
+        pygame.quit()
+
+    def events(self) -> None:
+        """Handle the window and the playback keys.
+        """
+        step = max(len(self.trace) // 10, 1)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    self.paused = not self.paused
+                    if not self.paused and self.frame() == len(self.trace) - 1:
+                        self.seek(0)
+                elif event.key == pygame.K_RIGHT:
+                    self.seek(self.frame() + 1)
+                elif event.key == pygame.K_LEFT:
+                    self.seek(self.frame() - 1)
+                elif event.key == pygame.K_PAGEDOWN:
+                    self.seek(self.frame() + step)
+                elif event.key == pygame.K_PAGEUP:
+                    self.seek(self.frame() - step)
+                elif event.key == pygame.K_HOME:
+                    self.seek(0)
+                elif event.key == pygame.K_END:
+                    self.seek(len(self.trace) - 1)
+                elif event.key == pygame.K_UP:
+                    self.speed *= 2
+                elif event.key == pygame.K_DOWN:
+                    self.speed /= 2
+
+    def show(self, frame:int) -> None:
+        """Draw the agents as they were at a frame. Only that frame is read
+        from the trace, and the agents are not drawn again if it is already
+        shown.
+
+        Args:
+            frame (int): index of the frame
+        """
+        pygame.display.set_caption(f'Ghosts - frame {frame + 1}/{len(self.trace)} at {self.speed:g} frames/s'
+            + (' (paused)' if self.paused else ''))
+        if frame == self.shown:
+            return
+        record = self.trace[frame]
+        for agent, pos, decision in zip(self.agents, record['pos'].tolist(), record['decision'].tolist()):
+            agent.pos = pos
+            agent.decision = decision
+        self.all_sprites.update()
+        self.renderer.draw(self.all_sprites)
+        self.shown = frame
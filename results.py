@@ -0,0 +1,186 @@
+import json
+import os
+from settings import *
+
+class ResultStore:
+    """
+    Append-only store of results in JSON Lines format. Every run is written
+    and flushed as soon as it ends, so a job that is killed keeps the runs it
+    finished and results never have to be held in memory.
+    """
+    def __init__(self, path:str) -> None:
+        """Create store
+
+        Args:
+            path (str): path of the JSON Lines file
+        """
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, 'a')
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.file.close()
+        self.file = None
+
+    def append(self, row:dict) -> None:
+        """Write the result of a run.
+
+        Args:
+            row (dict): result of the run
+        """
+        self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+
+class Summary:
+    """
+    Running totals of results, so any number of runs can be aggregated
+    without keeping them.
+    """
+    def __init__(self) -> None:
+        self.runs = 0
+        self.frames = 0
+        self.accuracy = 0.0
+        self.wall_time = 0.0
+        self.decisions = []
+        self.phases = {}
+        self.counts = {}
+
+    def add(self, row:dict) -> None:
+        """Add the result of a run to the totals.
+
+        Args:
+            row (dict): result of the run
+        """
+        self.runs += 1
+        self.frames += row['frames']
+        self.accuracy += row['accuracy']
+        self.wall_time += row.get('wall_time', 0.0)
+        decisions = row.get('decisions', [])
+        self.decisions += [0] * (len(decisions) - len(self.decisions))
+        for colour, count in enumerate(decisions):
+            self.decisions[colour] += count
+        profile = row.get('profile')
+        if profile:
+            for phase, timing in profile['phases'].items():
+                self.phases[phase] = self.phases.get(phase, 0.0) + timing['total']
+            for counter, count in profile['counts'].items():
+                self.counts[counter] = self.counts.get(counter, 0) + count
+
+    def mean_frames(self) -> float:
+        """Return the average number of frames of the runs
+
+        Returns:
+            float: average number of frames
+        """
+        return self.frames / self.runs if self.runs else 0.0
+
+    def mean_accuracy(self) -> float:
+        """Return the average accuracy of the runs
+
+        Returns:
+            float: average accuracy
+        """
+        return self.accuracy / self.runs if self.runs else 0.0
+
+    def print(self) -> None:
+        """Print the average time and accuracy of the runs
+        """
+        print('\nResults')
+        print('==========')
+        print('Runs: ', self.runs)
+        print("Average time: ", self.mean_frames())
+        print("Average accuracy: ", self.mean_accuracy())
+        print('Decisions per colour: ', self.decisions)
+        print('Wall time: ', round(self.wall_time, 3), 's')
+        if self.phases:
+            print('\nProfile')
+            print('==========')
+            for phase, total in self.phases.items():
+                print(f'{phase}: ', round(total, 3), 's')
+            for counter, count in self.counts.items():
+                print(f'{counter}: ', count)
+
+def read_results(path:str, seed:int = None, config:dict = None):
+    """Read the results of a store one run at a time. A last line cut off
+    by a killed job is skipped.
+
+    Args:
+        path (str): path of the JSON Lines file
+        seed (int, optional): only read runs of this master seed. Defaults to None.
+        config (dict, optional): only read runs of this configuration.
+            Defaults to None.
+
+    Yields:
+        dict: result of a run
+    """
+    with open(path) as file:
+        for line in file:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if seed is not None and row.get('seed') != seed:
+                continue
+            if config is not None and row.get('config') != config:
+                continue
+            yield row
+
+def summarise(rows) -> dict:
+    """Aggregate results by configuration.
+
+    Args:
+        rows (Iterable[dict]): results of runs
+
+    Returns:
+        dict: Summary of every configuration, keyed by the configuration in JSON
+    """
+    summaries = {}
+    for row in rows:
+        key = json.dumps(row.get('config'), sort_keys=True)
+        summaries.setdefault(key, Summary()).add(row)
+    return summaries
+
+def plot_results(rows) -> None:
+    """Plot the time and accuracy of runs
+
+    Args:
+        rows (Iterable[dict]): results of runs
+    """
+    # matplotlib is only imported when results are plotted
+    import matplotlib.pyplot as plt
+    times = []
+    accuracies = []
+    for row in rows:
+        times.append(row['frames'])
+        accuracies.append(row['accuracy'])
+    plt.scatter(times, accuracies)
+    plt.xlabel('Frames', fontsize='12')
+    plt.ylabel('Accuracy', fontsize='12')
+    plt.show()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Summarise and plot results stored by pacman.py and sweep.py')
+    parser.add_argument("results",
+                        metavar="results file",
+                        help="JSON Lines file with results, e.g. results.jsonl")
+    parser.add_argument('--seed', required=False, type=int,
+                        metavar="master seed",
+                        help="Only use runs of this master seed")
+    parser.add_argument('--plot', action='store_true',
+                        help="Plot the time and accuracy of every run")
+
+    args = parser.parse_args()
+    for key, summary in summarise(read_results(args.results, args.seed)).items():
+        print('\nConfiguration: ', key)
+        summary.print()
+    if args.plot:
+        plot_results(read_results(args.results, args.seed))
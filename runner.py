@@ -0,0 +1,116 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# Game of the last configuration, kept per worker process so the map is only
+# built once for consecutive jobs of a configuration. Only one is kept, as
+# games of large maps take a lot of memory
+games = {}
+
+def run_seeds(seed:int, n_runs:int) -> list[int]:
+    """Derive a deterministic seed for every run from a master seed.
+
+    Args:
+        seed (int): master seed
+        n_runs (int): number of runs
+
+    Returns:
+        list[int]: seed of each run
+    """
+    return np.random.SeedSequence(seed).generate_state(n_runs, np.uint64).tolist()
+
+def batch_sizes(n_runs:int, batch:int) -> list[int]:
+    """Split runs into batches simulated together.
+
+    Args:
+        n_runs (int): number of runs
+        batch (int): maximum number of runs in a batch
+
+    Returns:
+        list[int]: number of runs in each batch
+    """
+    return [batch] * (n_runs // batch) + ([n_runs % batch] if n_runs % batch else [])
+
+def simulate(config:dict, seed:int, n_runs:int = 1) -> list[dict]:
+    """Run a single headless simulation, or a batch of them with the NumPy
+    engine. Used as the task of worker processes.
+
+    Args:
+        config (dict): arguments of Game, without n_games and headless
+        seed (int): seed of the run or batch
+        n_runs (int, optional): number of runs in the batch. Defaults to 1.
+
+    Returns:
+        list[dict]: frames, accuracy, decisions per colour and wall time of
+            each run
+    """
+    from game import Game
+    key = repr(sorted(config.items()))
+    if key not in games:
+        games.clear()
+        games[key] = Game(n_games=1, headless=True, verbose=False, **config)
+    return games[key].play(seed, n_runs)
+
+def run_jobs(jobs:list, workers:int, task=None):
+    """Run simulation jobs on a pool of worker processes and yield their
+    results as they complete. With a single worker jobs run in this process.
+
+    Args:
+        jobs (list[tuple[dict, int, int]]): configuration, seed and number
+            of runs of every job
+        workers (int): number of worker processes
+        task (Callable, optional): function running a job in this process
+            instead of simulate. Defaults to None.
+
+    Yields:
+        tuple[int, list[dict]]: index of the job and the result of each of
+            its runs
+    """
+    if workers <= 1:
+        for index, job in enumerate(jobs):
+            yield index, (task or simulate)(*job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(simulate, *job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def run_rows(config:dict, n_runs:int, workers:int, seed:int, batch:int = 1, task=None, done=()):
+    """Spread independent runs, or batches of runs, over a pool of worker
+    processes and yield the result of every run as it completes.
+
+    Args:
+        config (dict): arguments of Game, without n_games and headless
+        n_runs (int): number of runs
+        workers (int): number of worker processes
+        seed (int): master seed the seed of each run or batch is derived from
+        batch (int, optional): number of runs simulated together by the
+            NumPy engine. Defaults to 1.
+        task (Callable, optional): function running a job in this process
+            when there is a single worker. Defaults to None.
+        done (Collection[int], optional): runs that already ended and are
+            not yielded again. Jobs of which every run ended are skipped.
+            Defaults to ().
+
+    Yields:
+        dict: master seed, run, seed of the run or its batch, frames,
+            accuracy, decisions per colour and wall time of the run, and
+            aborted if the run was stopped before it ended
+    """
+    sizes = batch_sizes(n_runs, batch)
+    jobs = [(config, run_seed, size) for size, run_seed in zip(sizes, run_seeds(seed, len(sizes)))]
+    starts = [index * batch for index in range(len(jobs))]
+    pending = [index for index, (_, _, size) in enumerate(jobs)
+        if any(starts[index] + offset not in done for offset in range(size))]
+    completed = sum(1 for run in done if run < n_runs)
+    for index, results in run_jobs([jobs[index] for index in pending], workers, task):
+        index = pending[index]
+        for offset, result in enumerate(results):
+            run = starts[index] + offset
+            if run in done:
+                continue
+            if result.get('aborted'):
+                print('Simulation', run + 1, 'was aborted')
+            else:
+                completed += 1
+                print('Simulation', run + 1, 'has ended', f'({completed}/{n_runs})')
+            yield {'seed': seed, 'run': run, 'run_seed': jobs[index][1], **result}
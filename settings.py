@@ -9,10 +9,22 @@ NAVY = (35, 57, 93)
 SEA_GREEN = (46,139,87)
 ROYAL_BLUE = (65,105,225)
 COLOURS = [WHITE, GREY, CORAL, SEA_GREEN, ROYAL_BLUE]
+# Tiles, observations and main colours are indices in COLOURS, which is only
+# read when drawing. Cells that are not tiles have the index NO_COLOUR
+WHITE_INDEX = COLOURS.index(WHITE)
+GREY_INDEX = COLOURS.index(GREY)
+NO_COLOUR = 255
 AGENTS_COLOURS = ['pink', 'yellow', 'red', 'blue']
 WORSTCASE_RATIO = 0.52
 EPSILON = 2 * (WORSTCASE_RATIO - 0.5)
 DELTA = 0.1
 X = 0.975
 MEAN = WORSTCASE_RATIO
-Z_SCORE = (X - MEAN) / DELTA
\ No newline at end of file
+Z_SCORE = (X - MEAN) / DELTA
+
+# Agents communicate when the circles enclosing their sprites, scaled by 2,
+# overlap. That is the case when their centres are closer than this distance.
+COMMUNICATION_RADIUS = 2.0 * (CELL_WIDTH ** 2 + CELL_HEIGHT ** 2) ** 0.5
+
+# Directory where precomputed decision boundaries are stored
+BOUNDARY_CACHE = '.cache'
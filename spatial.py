@@ -0,0 +1,95 @@
+import math
+from profiling import profiler
+from settings import *
+
+class SpatialHash:
+    """
+    Grid-bucket index of agents keyed by their position. Buckets are at
+    least as large as the communication radius, so the agents within the
+    radius of an agent are always in its own or one of the adjacent buckets.
+    """
+    def __init__(self, radius:float = COMMUNICATION_RADIUS) -> None:
+        """Create an empty index
+
+        Args:
+            radius (float, optional): communication radius in pixels.
+                Defaults to COMMUNICATION_RADIUS.
+        """
+        self.radius = radius
+        self.bucket_width = max(1, math.ceil(radius / CELL_WIDTH))
+        self.bucket_height = max(1, math.ceil(radius / CELL_HEIGHT))
+        self.buckets = {}
+        self.keys = {}
+
+    def key(self, pos) -> tuple[int, int]:
+        """Return the bucket of a position.
+
+        Args:
+            pos (list[int]): position in the map
+
+        Returns:
+            tuple[int, int]: bucket coordinates
+        """
+        return pos[0] // self.bucket_width, pos[1] // self.bucket_height
+
+    def insert(self, agent) -> None:
+        """Add an agent to the index.
+
+        Args:
+            agent (GhostAgent): agent to add
+        """
+        key = self.key(agent.pos)
+        self.keys[agent] = key
+        self.buckets.setdefault(key, {})[agent] = None
+
+    def remove(self, agent) -> None:
+        """Remove an agent from the index.
+
+        Args:
+            agent (GhostAgent): agent to remove
+        """
+        key = self.keys.pop(agent)
+        bucket = self.buckets[key]
+        del bucket[agent]
+        if not bucket:
+            del self.buckets[key]
+
+    def move(self, agent) -> None:
+        """Update the bucket of an agent after it has moved.
+
+        Args:
+            agent (GhostAgent): agent that moved
+        """
+        if self.keys[agent] != self.key(agent.pos):
+            self.remove(agent)
+            self.insert(agent)
+
+    def query(self, agent) -> list:
+        """Return the other agents within the communication radius of an agent.
+        Agents are in range when the distance between their centres is at
+        most the radius, like pygame's circle collision.
+
+        Args:
+            agent (GhostAgent): agent looking for neighbours
+
+        Returns:
+            list[GhostAgent]: agents in range
+        """
+        x, y = agent.pos
+        bx, by = self.keys[agent]
+        limit = self.radius ** 2
+        neighbours = []
+        tested = 0
+        for i in (bx - 1, bx, bx + 1):
+            for j in (by - 1, by, by + 1):
+                bucket = self.buckets.get((i, j))
+                if not bucket:
+                    continue
+                tested += len(bucket)
+                for other in bucket:
+                    dx = (other.pos[0] - x) * CELL_WIDTH
+                    dy = (other.pos[1] - y) * CELL_HEIGHT
+                    if dx * dx + dy * dy <= limit and other is not agent:
+                        neighbours.append(other)
+        profiler.count('collisions', tested)
+        return neighbours
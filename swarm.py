@@ -0,0 +1,569 @@
+import math
+import numpy as np
+from algorithms import DecisionBoundary, beta_cdf
+from ghosts import Actions
+from profiling import profiler
+import time
+from settings import *
+
+# Directions as an array, in the same order as Actions.directions
+DIRECTIONS = np.array(Actions.directions, dtype=np.int64)
+
+class Swarm:
+    """
+    Swarm of agents stored as NumPy arrays. A call to step moves every agent,
+    lets them observe their tiles, updates their algorithm, checks for
+    decisions and lets them communicate, all in batched array operations.
+    It follows the semantics of BayesianAlgorithm and BenchmarkAlgorithm, but
+    agents are updated simultaneously instead of one after the other.
+
+    Several independent runs of the same configuration can be simulated at
+    once. Agent arrays are indexed by (run, ghost) and every run has its own
+    tile colours. Runs that finish are removed from the arrays.
+    """
+    def __init__(self, algorithm_id:int, wall_map, n_ghosts:int, n_colours:int = 2,
+            radius:float = COMMUNICATION_RADIUS, posterior:float = 0.99, prior = 1,
+            positive_feedback:bool = True, simultaneous:bool = False, rng = None, n_runs:int = 1) -> None:
+        """Create swarm and place agents on random tiles
+
+        Args:
+            algorithm_id (int): The algorithm id.
+                1 - Bayesian algorithm
+                2 - Benchmark algorithm
+            wall_map (Map): map the agents walk in. The first run uses its
+                current colours, the other runs reset them.
+            n_ghosts (int): number of agents
+            n_colours (int, optional): number of colours. Defaults to 2.
+            radius (float, optional): communication radius in pixels.
+                Defaults to COMMUNICATION_RADIUS.
+            posterior (float, optional): credible threshold of the Bayesian
+                algorithm. Defaults to 0.99.
+            prior (int, optional): prior of alpha and beta of the Bayesian
+                algorithm. Defaults to 1.
+            positive_feedback (bool, optional): Bayesian agents broadcast their
+                decision. Defaults to True.
+            simultaneous (bool, optional): Bayesian agents decide on all
+                colours at once, like MultiColourAlgorithm. Defaults to False.
+            rng (np.random.Generator, optional): random generator.
+                Defaults to None.
+            n_runs (int, optional): number of runs simulated at once.
+                Defaults to 1.
+        """
+        self.algorithm_id = algorithm_id
+        self.map = wall_map
+        self.n = n_ghosts
+        self.n_colours = n_colours
+        self.posterior = posterior
+        self.prior = prior
+        self.positive_feedback = positive_feedback
+        self.simultaneous = simultaneous and algorithm_id == 1
+        self.boundary = DecisionBoundary.get(prior, posterior)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Agents in range of every agent are counted for traces when set
+        self.count_contacts = False
+        self.contacts = None
+        # Messages sent, counted like the profiler's broadcasts
+        self.messages = 0
+        self.build_moves()
+        self.build_neighbourhood(radius)
+
+        colours = [self.read_colours()]
+        for i in range(n_runs - 1):
+            self.map.reset_colours()
+            colours.append(self.read_colours())
+        self.colours = np.stack(colours)
+        self.runs = np.arange(n_runs)
+
+        shape = (n_runs, self.n)
+        tiles = np.asarray(self.map.tiles, dtype=np.int64)
+        self.pos = tiles[self.rng.integers(len(tiles), size=shape)]
+        self.cells = self.pos[..., 0] * self.rows + self.pos[..., 1]
+        self.decision = np.full(shape, -1, dtype=np.int8)
+        self.alpha = np.full(shape, prior)
+        self.beta = np.full(shape, prior)
+        self.last_C = np.zeros(shape, dtype=np.int64)
+        self.main_colour = np.zeros(n_runs, dtype=np.int64)
+        self.pcs = np.full(shape + (n_colours,), -np.inf)
+
+        if self.simultaneous:
+            # A beta model and a decision per colour; last_C is the colour observed
+            self.alpha = np.full(shape + (n_colours,), prior)
+            self.beta = np.full(shape + (n_colours,), prior)
+            self.colour_decision = np.full(shape + (n_colours,), -1, dtype=np.int8)
+
+        if self.algorithm_id == 2:
+            self.alpha = np.ones(shape, dtype=np.int64)
+            self.beta = np.ones(shape, dtype=np.int64)
+            self.s = ((4*0.52*0.48*(Z_SCORE**2)) / (EPSILON**2)) / n_ghosts
+            t_comm = 2 * math.log((n_ghosts ** 2) / 0.1) * (1240)
+            self.phase_1 = np.full(shape, round(self.s / n_ghosts), dtype=np.int64)
+            self.phase_2 = np.full(shape, round(self.s + t_comm), dtype=np.int64)
+            # seen[r, i, j] is True once agent i of run r holds the counts of agent j
+            self.seen = np.zeros((n_runs, self.n, self.n), dtype=bool)
+            self.alpha_t = np.zeros(shape, dtype=np.int64)
+            self.beta_t = np.zeros(shape, dtype=np.int64)
+
+    def __getstate__(self) -> dict:
+        # Tables shared with the map are not pickled, restore takes them again
+        state = self.__dict__.copy()
+        for name in ('map', 'moves', 'move_offsets', 'degree', 'buffer'):
+            del state[name]
+        return state
+
+    def restore(self, wall_map) -> None:
+        """Take the tables of an unpickled swarm from the map again.
+
+        Args:
+            wall_map (Map): map the agents walk in
+        """
+        self.map = wall_map
+        self.build_moves()
+        self.buffer = np.zeros(0, dtype=np.int64)
+
+    @property
+    def n_runs(self) -> int:
+        """Number of runs that are still simulated.
+
+        Returns:
+            int: number of runs
+        """
+        return len(self.runs)
+
+    def build_moves(self) -> None:
+        """Take the legal moves from every cell from the map's navigation
+        graph. Cells are indexed by x * rows + y.
+        """
+        self.cols, self.rows = self.map.size()
+        self.degree = self.map.nav_degree
+        self.move_offsets = self.map.nav_offsets
+        self.moves = self.map.nav_moves
+
+    def read_colours(self) -> np.ndarray:
+        """Return a copy of the current colour of every cell of the map.
+
+        Returns:
+            np.ndarray: index in COLOURS of every cell, NO_COLOUR if not a tile
+        """
+        return self.map.colour_grid.reshape(-1).copy()
+
+    def build_neighbourhood(self, radius:float) -> None:
+        """Find the cell offsets within the communication radius. Neighbours
+        are looked up in a padded grid so offsets never wrap around an edge,
+        and every run has its own copy of the grid.
+
+        Args:
+            radius (float): communication radius in pixels
+        """
+        reach_x = int(radius // CELL_WIDTH)
+        reach_y = int(radius // CELL_HEIGHT)
+        self.padded_rows = self.rows + 2 * reach_y
+        self.padded_size = (self.cols + 2 * reach_x) * self.padded_rows
+        self.pad = reach_x * self.padded_rows + reach_y
+        self.offsets = np.array([dx * self.padded_rows + dy
+            for dx in range(-reach_x, reach_x + 1)
+            for dy in range(-reach_y, reach_y + 1)
+            if (dx * CELL_WIDTH) ** 2 + (dy * CELL_HEIGHT) ** 2 <= radius ** 2], dtype=np.int64)
+        self.buffer = np.zeros(0, dtype=np.int64)
+
+    def padded_cells(self) -> np.ndarray:
+        """Return the agents' cells in the padded grid of their run.
+
+        Returns:
+            np.ndarray: padded cell index of every agent
+        """
+        run = np.arange(self.n_runs)[:, None] * self.padded_size
+        return self.pos[..., 0] * self.padded_rows + self.pos[..., 1] + self.pad + run
+
+    def step(self) -> None:
+        """Advance all agents by one frame.
+        """
+        profiling = profiler.enabled
+        if profiling:
+            start = time.perf_counter()
+        self.move()
+        if profiling:
+            start = profiler.add('walk', start)
+        observation = np.take_along_axis(self.colours, self.cells, axis=1)
+        if profiling:
+            start = profiler.add('observe', start)
+        if self.simultaneous:
+            self.multi_update(observation)
+        elif self.algorithm_id == 1:
+            self.bayesian_update(observation)
+        else:
+            self.benchmark_update(observation)
+        if profiling:
+            start = profiler.add('algorithm', start)
+        if self.simultaneous:
+            self.multi_broadcast()
+        elif self.algorithm_id == 1:
+            self.bayesian_broadcast()
+        else:
+            self.benchmark_broadcast()
+        if profiling:
+            profiler.add('communication', start)
+
+    def move(self) -> None:
+        """Move every agent in a random legal direction.
+        """
+        degree = self.degree[self.cells]
+        choice = (self.rng.random(self.cells.shape) * degree).astype(np.int64)
+        self.pos += DIRECTIONS[self.moves[self.move_offsets[self.cells] + choice]]
+        self.cells = self.pos[..., 0] * self.rows + self.pos[..., 1]
+
+    def bayesian_update(self, observation:np.ndarray) -> None:
+        """Update the beta models with the observations and check which
+        undecided agents have overcome the credible threshold, using the
+        shared decision boundary table.
+
+        Args:
+            observation (np.ndarray): colour index of every agent's tile
+        """
+        C = (observation == self.main_colour[:, None]).astype(np.int64)
+        self.last_C = C
+        self.alpha += C
+        self.beta += (1 - C)
+        run, agent = np.nonzero(self.decision == -1)
+        if not run.size:
+            return
+        alpha = self.alpha[run, agent]
+        beta_ = self.beta[run, agent]
+        decision = self.boundary_decisions(alpha, beta_)
+        self.decision[run, agent] = decision
+        decided = decision != -1
+        if decided.any():
+            run = run[decided]
+            agent = agent[decided]
+            profiler.count('cdf', run.size)
+            p = self.decision_cdfs(alpha[decided], beta_[decided])
+            self.pcs[run, agent, self.main_colour[run]] = 1 - p
+
+    def decision_cdfs(self, alpha:np.ndarray, beta_:np.ndarray) -> np.ndarray:
+        """Evaluate the beta CDF at 0.5 of the models of agents that decided.
+        Agents decide once per colour, so every CDF is evaluated like the
+        object engine does instead of over arrays by scipy.
+
+        Args:
+            alpha (np.ndarray): alpha of every model
+            beta_ (np.ndarray): beta of every model
+
+        Returns:
+            np.ndarray: CDF of every model
+        """
+        return np.array([beta_cdf(0.5, a, b) for a, b in zip(alpha.tolist(), beta_.tolist())])
+
+    def boundary_decisions(self, alpha:np.ndarray, beta_:np.ndarray) -> np.ndarray:
+        """Look up the decisions of beta models in the shared decision
+        boundary table.
+
+        Args:
+            alpha (np.ndarray): alpha of every model
+            beta_ (np.ndarray): beta of every model
+
+        Returns:
+            np.ndarray: -1 if undecided, 0 or 1 otherwise, for every model
+        """
+        n = np.rint(alpha + beta_ - 2 * self.prior).astype(np.int64)
+        self.boundary.grow(n.max())
+        k = np.rint(alpha - self.prior).astype(np.int64)
+        decision = np.full(n.shape, -1, dtype=np.int8)
+        decision[k <= self.boundary.lower[n]] = 0
+        decision[k >= self.boundary.upper[n]] = 1
+        return decision
+
+    def multi_update(self, observation:np.ndarray) -> None:
+        """Update the beta model of every colour with the observations and
+        check the undecided colours of undecided agents in one lookup, like
+        MultiColourAlgorithm. Agents whose colours are all decided decide 1
+        if their most likely majority is the main colour and 0 otherwise.
+
+        Args:
+            observation (np.ndarray): colour index of every agent's tile
+        """
+        C = observation[..., None] == np.arange(self.n_colours)
+        self.last_C = observation
+        self.alpha += C
+        self.beta += ~C
+        run, agent, colour = np.nonzero(self.colour_decision == -1)
+        if not run.size:
+            return
+        alpha = self.alpha[run, agent, colour]
+        beta_ = self.beta[run, agent, colour]
+        decision = self.boundary_decisions(alpha, beta_)
+        self.colour_decision[run, agent, colour] = decision
+        decided = decision != -1
+        if not decided.any():
+            return
+        profiler.count('cdf', int(np.count_nonzero(decided)))
+        p = self.decision_cdfs(alpha[decided], beta_[decided])
+        self.pcs[run[decided], agent[decided], colour[decided]] = 1 - p
+        complete = (self.decision == -1) & (self.colour_decision != -1).all(axis=-1)
+        if complete.any():
+            best = np.argmax(self.pcs[complete], axis=-1)
+            main = np.broadcast_to(self.main_colour[:, None], complete.shape)[complete]
+            self.decision[complete] = best == main
+
+    def bayesian_broadcast(self) -> None:
+        """Every agent receives the observation, or decision with positive
+        feedback, of its neighbours. Like GhostAgent.bayes_receive only
+        positive information changes the receiver's alpha.
+        """
+        info = self.last_C
+        if self.positive_feedback:
+            info = np.where(self.decision != -1, self.decision, self.last_C)
+        senders = info == 1
+        if self.count_contacts:
+            # Every agent is counted in the high bits as well, so a single pass
+            # counts both the senders and all agents in range
+            counts = self.neighbour_counts(np.ones(senders.shape, dtype=bool),
+                (senders.astype(np.int64) << 32) + 1)
+            received = (counts >> 32) - senders
+            self.contacts = (counts & 0xFFFFFFFF) - 1
+        else:
+            received = self.neighbour_counts(senders) - senders
+        self.alpha += received
+        # Only messages carrying a success are counted, the others change nothing
+        sent = int(received.sum())
+        self.messages += sent
+        if profiler.enabled:
+            self.count_collisions()
+            profiler.count('broadcasts', sent)
+
+    def multi_broadcast(self) -> None:
+        """Every agent receives one bit per colour from its neighbours, the
+        colour's decision with positive feedback once it is decided and
+        whether it was observed otherwise. Like MultiColourAlgorithm only set
+        bits change the receiver's alphas.
+        """
+        bits = self.last_C[..., None] == np.arange(self.n_colours)
+        if self.positive_feedback:
+            bits = np.where(self.colour_decision != -1, self.colour_decision == 1, bits)
+        if self.count_contacts:
+            self.contacts = self.neighbour_counts(np.ones(self.last_C.shape, dtype=bool)) - 1
+        sent = 0
+        for colour in range(self.n_colours):
+            senders = bits[..., colour]
+            received = self.neighbour_counts(senders) - senders
+            self.alpha[..., colour] += received
+            sent += int(received.sum())
+        self.messages += sent
+        if profiler.enabled:
+            self.count_collisions()
+            profiler.count('broadcasts', sent)
+
+    def count_collisions(self) -> None:
+        """Count the agents in range of every agent, including itself, as
+        the profiler's collisions. Only cells within the radius are visited,
+        so every agent counted is in range, while the spatial hash of the
+        object engine also counts the agents it tests and finds out of range.
+        """
+        if self.count_contacts:
+            in_range = self.contacts + 1
+        else:
+            in_range = self.neighbour_counts(np.ones(self.cells.shape, dtype=bool))
+        profiler.count('collisions', int(in_range.sum()))
+
+    def neighbour_counts(self, mask:np.ndarray, weight:np.ndarray = None) -> np.ndarray:
+        """Count, for every agent, the agents of its run selected by the mask
+        within the communication radius, including itself.
+
+        Args:
+            mask (np.ndarray): boolean mask of agents to count
+            weight (np.ndarray, optional): value every agent counts for.
+                Defaults to 1.
+
+        Returns:
+            np.ndarray: count for every agent
+        """
+        cells = self.padded_cells()
+        if len(self.buffer) < self.n_runs * self.padded_size:
+            self.buffer = np.zeros(self.n_runs * self.padded_size, dtype=np.int64)
+        selected = cells[mask]
+        np.add.at(self.buffer, selected, 1 if weight is None else weight[mask])
+        counts = self.buffer[cells[..., None] + self.offsets].sum(axis=-1)
+        self.buffer[selected] = 0
+        return counts
+
+    def neighbour_pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return every pair of distinct agents of the same run within the
+        communication radius, as flat indices into the (run, ghost) arrays.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: receivers and senders of each pair
+        """
+        cells = self.padded_cells().ravel()
+        order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[order]
+        target = (cells[:, None] + self.offsets).ravel()
+        start = np.searchsorted(sorted_cells, target, 'left')
+        counts = np.searchsorted(sorted_cells, target, 'right') - start
+        total = counts.sum()
+        ends = np.cumsum(counts)
+        within = np.arange(total) - np.repeat(ends - counts, counts)
+        receivers = np.repeat(np.arange(cells.size).repeat(len(self.offsets)), counts)
+        senders = order[np.repeat(start, counts) + within]
+        distinct = receivers != senders
+        return receivers[distinct], senders[distinct]
+
+    def benchmark_update(self, observation:np.ndarray) -> None:
+        """Updates every agent accordingly to its phase.
+
+        Args:
+            observation (np.ndarray): colour index of every agent's tile
+        """
+        C = (observation == WHITE_INDEX).astype(np.int64)
+        phase_1 = self.phase_1 > 0
+        self.alpha[phase_1] += C[phase_1]
+        self.beta[phase_1] += (1 - C[phase_1])
+        self.phase_1[phase_1] -= 1
+
+        phase_2 = ~phase_1 & (self.phase_2 > self.s)
+        self.receive(np.flatnonzero(phase_2), np.flatnonzero(phase_2))
+        self.phase_2[phase_2] -= 1
+
+        final = ~phase_1 & ~phase_2
+        self.decision[final] = np.where(self.beta_t[final] > self.alpha_t[final], 0, 1)
+
+    def benchmark_broadcast(self) -> None:
+        """Every agent past phase 1 receives the counts of its neighbours.
+        """
+        receivers, senders = self.neighbour_pairs()
+        if self.count_contacts:
+            self.contacts = np.bincount(receivers, minlength=self.cells.size).reshape(self.cells.shape)
+        listening = self.phase_1.ravel()[receivers] <= 0
+        sent = int(np.count_nonzero(listening))
+        self.messages += sent
+        if profiler.enabled:
+            # Pairs of distinct agents, and every agent with itself
+            profiler.count('collisions', receivers.size + self.cells.size)
+            profiler.count('broadcasts', sent)
+        self.receive(receivers[listening], senders[listening])
+
+    def receive(self, receivers:np.ndarray, senders:np.ndarray) -> None:
+        """Store the senders' counts in the receivers' totals. Counts stop
+        changing after phase 1, which all agents leave in the same frame, so
+        only the first message of each sender changes the totals.
+
+        Args:
+            receivers (np.ndarray): flat indices of agents receiving the counts
+            senders (np.ndarray): flat indices of agents sending their counts
+        """
+        run, receiver = np.divmod(receivers, self.n)
+        sender = senders % self.n
+        new = ~self.seen[run, receiver, sender]
+        self.seen[run[new], receiver[new], sender[new]] = True
+        receivers = receivers[new]
+        senders = senders[new]
+        np.add.at(self.alpha_t.reshape(-1), receivers, self.alpha.reshape(-1)[senders])
+        np.add.at(self.beta_t.reshape(-1), receivers, self.beta.reshape(-1)[senders])
+
+    def reset(self, colour, runs = None) -> None:
+        """Reset the Bayesian models of the agents of some runs with a new
+        main colour.
+
+        Args:
+            colour (int | np.ndarray): index of the new main colour in
+                COLOURS, for every selected run
+            runs (np.ndarray, optional): boolean mask of the runs to reset.
+                Defaults to None, which resets all runs.
+        """
+        if runs is None:
+            runs = np.ones(self.n_runs, dtype=bool)
+        self.decision[runs] = -1
+        self.alpha[runs] = self.prior
+        self.beta[runs] = self.prior
+        self.last_C[runs] = 0
+        self.main_colour[runs] = colour
+
+    def decided(self) -> np.ndarray:
+        """Return for every run whether all of its agents made a decision.
+
+        Returns:
+            np.ndarray: boolean for every run
+        """
+        return (self.decision != -1).all(axis=1)
+
+    def all_decided(self) -> bool:
+        """Return true if every agent of every run has made a decision.
+
+        Returns:
+            bool: true if all agents decided
+        """
+        return bool(self.decided().all())
+
+    def decision_counts(self) -> np.ndarray:
+        """Count the agents of every run that decided on each colour, in the
+        same way as Game.decision_counts.
+
+        Returns:
+            np.ndarray: number of agents of every run and colour, in the
+                order of COLOURS
+        """
+        if self.n_colours == 2:
+            correct = np.count_nonzero(self.decision != 0, axis=1)
+            return np.stack([correct, self.n - correct], axis=1)
+        best = np.argmax(self.pcs, axis=-1)
+        return (best[..., None] == np.arange(self.n_colours)).sum(axis=1)
+
+    def get_average_accuracy(self) -> np.ndarray:
+        """Calculate the average correctness of the agents' decisions of
+        every run, in the same way as Game.get_average_accuracy.
+
+        Returns:
+            np.ndarray: average accuracy of every run
+        """
+        return self.decision_counts()[:, WHITE_INDEX] / self.n
+
+    def keep(self, runs:np.ndarray) -> None:
+        """Keep only some runs in the arrays.
+
+        Args:
+            runs (np.ndarray): boolean mask of the runs to keep
+        """
+        names = ['runs', 'colours', 'pos', 'cells', 'decision', 'alpha', 'beta',
+            'last_C', 'main_colour', 'pcs']
+        if self.simultaneous:
+            names += ['colour_decision']
+        if self.algorithm_id == 2:
+            names += ['phase_1', 'phase_2', 'seen', 'alpha_t', 'beta_t']
+        for name in names:
+            setattr(self, name, getattr(self, name)[runs])
+
+    def simulate(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Run all runs until their agents have made a decision, following the
+        same rules as Game.events for every run. Finished runs are masked out
+        while the others keep going.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: frames, average
+                accuracy and decisions per colour of every run
+        """
+        frames = np.zeros(self.n_runs, dtype=np.int64)
+        accuracies = np.zeros(self.n_runs)
+        decisions = np.zeros((self.n_runs, self.n_colours), dtype=np.int64)
+        colour_count = np.zeros(self.n_runs, dtype=np.int64)
+        decided = np.zeros(self.n_runs, dtype=bool)
+        frame = 0
+        while self.n_runs:
+            frame += 1
+            # Frames are counted like Game.game_loop counts them, the timings
+            # of every step are added to the totals at the start of the next
+            profiler.end_frame()
+            finished = decided & ((self.n_colours == 2) | self.simultaneous | (colour_count > self.n_colours - 2))
+            reset = decided & ~finished
+            colour_count[reset] += 1
+            if finished.any():
+                frames[self.runs[finished]] = frame
+                counts = self.decision_counts()[finished]
+                decisions[self.runs[finished]] = counts
+                accuracies[self.runs[finished]] = counts[:, WHITE_INDEX] / self.n
+                self.keep(~finished)
+                colour_count = colour_count[~finished]
+                reset = reset[~finished]
+                if not self.n_runs:
+                    break
+            self.step()
+            if reset.any():
+                self.reset(colour_count[reset], reset)
+            decided = self.decided()
+        return frames, accuracies, decisions
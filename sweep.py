@@ -0,0 +1,141 @@
+import itertools
+import json
+from results import ResultStore
+from runner import batch_sizes, run_jobs, run_seeds
+from settings import *
+
+# Value of every sweep parameter that a sweep file does not set
+DEFAULTS = {
+    'algorithm': 'bayesian',
+    'ratio': [0.55],
+    'map': 'classic',
+    'ghosts': 25,
+    'colours': None,
+    'posterior': 0.99,
+    'prior': 1,
+    'feedback': True,
+    'simultaneous': False,
+    'engine': 'object',
+    'radius': COMMUNICATION_RADIUS,
+}
+
+def expand(spec:dict) -> list[dict]:
+    """Expand a sweep into the list of configurations it covers. 'grid' maps
+    parameters to lists of values and every combination is a configuration;
+    'configs' lists configurations explicitly. Parameters missing from both
+    come from 'fixed', then from DEFAULTS.
+
+    Args:
+        spec (dict): sweep specification
+
+    Returns:
+        list[dict]: configurations with a value for every parameter
+    """
+    base = {**DEFAULTS, **spec.get('fixed', {})}
+    grid = spec.get('grid', {})
+    configs = []
+    if grid:
+        names = list(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            configs.append({**base, **dict(zip(names, values))})
+    for config in spec.get('configs', []):
+        configs.append({**base, **config})
+    if not configs:
+        configs.append(base)
+    unknown = set().union(*configs) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f'Unknown sweep parameters: {sorted(unknown)}')
+    for config in configs:
+        if config['colours'] is None:
+            config['colours'] = len(config['ratio']) + 1
+    return configs
+
+def game_config(config:dict) -> dict:
+    """Check a configuration and convert it into the arguments of Game.
+
+    Args:
+        config (dict): configuration with a value for every parameter
+
+    Returns:
+        dict: arguments of Game, without n_games and headless
+    """
+    if config['algorithm'] not in ('bayesian', 'benchmark'):
+        raise ValueError('Invalid algorithm.')
+    if config['algorithm'] == 'benchmark' and config['colours'] > 2:
+        raise ValueError('Benchmark algorithm is used in Binary scenarios only')
+    if len(config['ratio']) + 1 != config['colours']:
+        raise ValueError('Ratio and number of colours do not match')
+    return {
+        'algorithm_id': 1 if config['algorithm'] == 'bayesian' else 2,
+        'ratio': list(config['ratio']),
+        'map_name': config['map'],
+        'n_ghosts': int(config['ghosts']),
+        'n_colours': int(config['colours']),
+        'engine': config['engine'],
+        'radius': float(config['radius']),
+        'posterior': float(config['posterior']),
+        'prior': config['prior'],
+        'positive_feedback': bool(config['feedback']),
+        'simultaneous': bool(config['simultaneous']),
+    }
+
+def run_sweep(spec:dict, output:str, workers:int = 1) -> int:
+    """Run every configuration of a sweep 'runs' times and append the result
+    of every run to the output file as soon as the run finishes. All
+    (configuration, seed) jobs share one pool of worker processes.
+
+    Args:
+        spec (dict): sweep specification
+        output (str): path of the JSON Lines file results are appended to
+        workers (int, optional): number of worker processes. Defaults to 1.
+
+    Returns:
+        int: number of runs written
+    """
+    configs = [game_config(config) for config in expand(spec)]
+    n_runs = spec.get('runs', 1)
+    seed = spec.get('seed', 0)
+    jobs = []
+    origins = []
+    for config in configs:
+        # Only the NumPy engine simulates runs in batches
+        batch = spec.get('batch', 1) if config['engine'] == 'numpy' else 1
+        sizes = batch_sizes(n_runs, batch)
+        for j, (size, run_seed) in enumerate(zip(sizes, run_seeds(seed, len(sizes)))):
+            jobs.append((config, run_seed, size))
+            origins.append(j * batch)
+    print('Sweep:', len(configs), 'configurations,', n_runs, 'runs each,', workers, 'workers')
+    written = 0
+    with ResultStore(output) as store:
+        for index, results in run_jobs(jobs, workers):
+            config, run_seed, _ = jobs[index]
+            for offset, result in enumerate(results):
+                store.append({'config': config, 'seed': seed, 'run': origins[index] + offset,
+                    'run_seed': run_seed, **result})
+                written += 1
+            print(f'{written}/{len(configs) * n_runs} runs written')
+    return written
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Run a parameter sweep described by a JSON file')
+    parser.add_argument("sweep",
+                        metavar="sweep file",
+                        help="JSON file with the sweep, e.g. sweeps/example.json")
+    parser.add_argument('--workers', required=False, type=int,
+                        metavar="number of workers",
+                        help="Number of worker processes, e.g. 32")
+    parser.add_argument('--output', required=False,
+                        metavar="results file",
+                        help="JSON Lines file results are appended to, e.g. results.jsonl")
+
+    args = parser.parse_args()
+    with open(args.sweep) as file:
+        spec = json.load(file)
+    workers = args.workers or spec.get('workers', 1)
+    output = args.output or spec.get('output', 'results.jsonl')
+    if workers < 1:
+        raise ValueError('Number of workers must be at least 1')
+    run_sweep(spec, output, workers)
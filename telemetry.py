@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from results import Summary
+
+class TelemetryHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests with the latest snapshot of the server's Telemetry
+    as JSON.
+    """
+    def do_GET(self) -> None:
+        if self.path not in ('/', '/telemetry'):
+            self.send_error(404)
+            return
+        snapshot = self.server.telemetry.snapshot
+        body = json.dumps({**snapshot, 'age': time.time() - snapshot['updated']}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+class Telemetry:
+    """
+    Live progress of a job served over HTTP on localhost. The simulation
+    loop builds a new snapshot at most every interval seconds and replaces
+    the previous one, and a daemon thread serves the latest snapshot, so
+    requests never block the simulation. A snapshot whose age keeps growing
+    belongs to a stalled job.
+    """
+    def __init__(self, port:int = 0, interval:float = 0.5, n_runs:int = 1, config:dict = None) -> None:
+        """Start the server
+
+        Args:
+            port (int, optional): port on localhost, 0 for any free port.
+                Defaults to 0.
+            interval (float, optional): seconds between snapshots. Defaults to 0.5.
+            n_runs (int, optional): number of runs of the job. Defaults to 1.
+            config (dict, optional): configuration of the job. Defaults to None.
+        """
+        self.interval = interval
+        self.n_runs = n_runs
+        self.config = config
+        self.summary = Summary()
+        self.last = time.perf_counter()
+        self.last_frame = 0
+        self.last_messages = 0
+        self.progress = {'frame': 0, 'fps': 0.0, 'undecided': None, 'messages_per_second': 0.0}
+        self.publish()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), TelemetryHandler)
+        self.server.daemon_threads = True
+        self.server.telemetry = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def update(self, frame:int, progress) -> None:
+        """Called by the simulation loop every frame. A snapshot is only built
+        when interval seconds have passed since the last one.
+
+        Args:
+            frame (int): frame of the current run
+            progress (Callable): returns the number of undecided agents and
+                of messages sent in the current run
+        """
+        now = time.perf_counter()
+        elapsed = now - self.last
+        if elapsed < self.interval:
+            return
+        undecided, messages = progress()
+        if frame < self.last_frame:
+            # A new run started since the last snapshot
+            self.last_frame = self.last_messages = 0
+        self.progress = {'frame': frame, 'fps': (frame - self.last_frame) / elapsed,
+            'undecided': undecided, 'messages_per_second': (messages - self.last_messages) / elapsed}
+        self.last = now
+        self.last_frame = frame
+        self.last_messages = messages
+        self.publish()
+
+    def add(self, row:dict) -> None:
+        """Add the result of a run that ended.
+
+        Args:
+            row (dict): result of the run
+        """
+        self.summary.add(row)
+        self.publish()
+
+    def publish(self) -> None:
+        """Replace the snapshot served to requests.
+        """
+        self.snapshot = {
+            'run': self.summary.runs,
+            'runs': self.n_runs,
+            **self.progress,
+            'completed': {'runs': self.summary.runs, 'mean_frames': self.summary.mean_frames(),
+                'mean_accuracy': self.summary.mean_accuracy(), 'wall_time': self.summary.wall_time,
+                'decisions': self.summary.decisions},
+            'config': self.config,
+            'updated': time.time(),
+        }
+
+    def close(self) -> None:
+        """Stop the server.
+        """
+        self.server.shutdown()
+        self.server.server_close()
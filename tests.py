@@ -1,6 +1,31 @@
-from algorithms import BayesianAlgorithm, BenchmarkAlgorithm
-from settings import *
+from algorithms import BayesianAlgorithm, BenchmarkAlgorithm, DecisionBoundary, MultiColourAlgorithm
+from checkpoint import load_checkpoint, save_checkpoint
+from benchmark import MIN_FRAMES, WINDOW, compare, measure, suite_cases
+from game import Game, Map
+from generate import generate_walls, layout_text, write_layout
+from ghosts import Actions, GhostAgent
+from layout import compile_layout, load_layout
+from profiling import PHASES, Profiler, profiler
+from renderer import images, load_image
+from replay import Replay
+from results import ResultStore, Summary, read_results, summarise
+import runner
+from runner import run_rows, run_seeds, simulate
+from spatial import SpatialHash
+from swarm import Swarm
+from telemetry import Telemetry
+from tracing import TraceReader, TraceWriter
+from sweep import expand, game_config, run_sweep
 from settings import *
+from scipy.stats import beta
+import json
+import pickle
+import subprocess
+import sys
+import urllib.error
+import urllib.request
+import numpy as np
+import pygame
 import pytest
 
 class TestBayesianAlgorithm():
@@ -9,47 +34,72 @@ class TestBayesianAlgorithm():
         return BayesianAlgorithm()
 
     def test_update(self, algorithm):
-        algorithm.update(WHITE)
+        algorithm.update(WHITE_INDEX)
         assert algorithm.alpha > (algorithm.prior)
         assert algorithm.last_C == 1
 
     def test_update_other(self,algorithm):
-        algorithm.update(BLACK)
+        algorithm.update(GREY_INDEX)
         assert algorithm.beta > (algorithm.prior)
         assert algorithm.last_C == 0
 
     def test_update_decision(self, algorithm):
         for i in range(10):
-            algorithm.update(WHITE)
+            algorithm.update(WHITE_INDEX)
         assert algorithm.decision == 1
 
     def test_update_decision_black(self, algorithm):
         for i in range(10):
-            algorithm.update(BLACK)
+            algorithm.update(GREY_INDEX)
         assert algorithm.decision == 0
     
     def test_reset(self, algorithm):
         for i in range(10):
-            algorithm.update(BLACK)
+            algorithm.update(GREY_INDEX)
         assert algorithm.decision == 0
-        algorithm.reset(BLACK)
+        algorithm.reset(GREY_INDEX)
         assert algorithm.decision == -1
         assert algorithm.alpha == algorithm.prior
         assert algorithm.beta == algorithm.prior
-        assert algorithm.main_colour == BLACK
+        assert algorithm.main_colour == GREY_INDEX
     
     def test_reset_decision(self,algorithm):
-        algorithm.reset(BLACK)
+        algorithm.reset(GREY_INDEX)
         for i in range(10):
-            algorithm.update(WHITE)
+            algorithm.update(WHITE_INDEX)
         assert algorithm.decision == 0
     
     def test_reset_decision_black(self, algorithm):
-        algorithm.reset(BLACK)
+        algorithm.reset(GREY_INDEX)
 
         for i in range(10):
-            algorithm.update(BLACK)
+            algorithm.update(GREY_INDEX)
+        assert algorithm.decision == 1
+
+
+class TestMultiColourAlgorithm():
+    @pytest.fixture()
+    def algorithm(self):
+        return MultiColourAlgorithm(3)
+
+    def test_update(self, algorithm):
+        algorithm.update(GREY_INDEX)
+        assert algorithm.alphas == [1, 2, 1]
+        assert algorithm.betas == [2, 1, 2]
+        assert algorithm.message() == 0b010
+
+    def test_decides_every_colour(self, algorithm):
+        for i in range(60):
+            algorithm.update(WHITE_INDEX if i % 4 else COLOURS.index(CORAL))
+        assert algorithm.decisions == [1, 0, 0]
+        assert set(algorithm.pcs) == {WHITE_INDEX, GREY_INDEX, COLOURS.index(CORAL)}
         assert algorithm.decision == 1
+        assert algorithm.message() == 0b001
+
+    def test_update_ratio(self, algorithm):
+        algorithm.update_ratio(0b101)
+        assert algorithm.alphas == [2, 1, 2]
+        assert algorithm.betas == [1, 1, 1]
 
 
 class TestBenchmarkAlgorithm():
@@ -67,29 +117,29 @@ class TestBenchmarkAlgorithm():
 
     def test_update_white(self, algorithm):
         prior_phase1 = algorithm.phase_1
-        algorithm.update(WHITE)
+        algorithm.update(WHITE_INDEX)
         assert algorithm.alpha > 1
 
     def test_phase1(self,algorithm):
         prior_phase1 = algorithm.phase_1
         for i in range(prior_phase1):
-            algorithm.update(WHITE)
+            algorithm.update(WHITE_INDEX)
         assert algorithm.alpha == prior_phase1 + 1
         assert algorithm.phase_1 == 0
         prior_observation = algorithm.alpha
-        algorithm.update(WHITE)
+        algorithm.update(WHITE_INDEX)
         assert algorithm.alpha == prior_observation
     
     def test_phase2(self, algorithm):
         prior_phase1 = algorithm.phase_1
         for i in range(prior_phase1):
-            algorithm.update(WHITE)
+            algorithm.update(WHITE_INDEX)
         prior_phase2 = algorithm.phase_2
-        algorithm.update(WHITE)
+        algorithm.update(WHITE_INDEX)
         assert algorithm.phase_2 == prior_phase2 - 1
 
     def test_update_black(self, algorithm):
-        algorithm.update(GREY)
+        algorithm.update(GREY_INDEX)
         assert algorithm.beta > 1
     
     def test_receive_info(self, algorithm):
@@ -97,11 +147,770 @@ class TestBenchmarkAlgorithm():
         algorithm2 = BenchmarkAlgorithm(n_ghosts=25)
 
         for i in range(prior_phase1):
-            algorithm2.update(WHITE)
+            algorithm2.update(WHITE_INDEX)
 
         for i in range(prior_phase1):
-            algorithm.update(GREY)
+            algorithm.update(GREY_INDEX)
         prior_alpha = algorithm2.alpha
         prior_beta = algorithm2.beta
-        algorithm.receive_info(algorithm2, algorithm2.alpha, algorithm2.beta)
-        assert algorithm.observations[algorithm2] == (prior_alpha, prior_beta)
\ No newline at end of file
+        algorithm.receive_info(1, algorithm2.alpha, algorithm2.beta)
+        assert (algorithm.alphas[1], algorithm.betas[1]) == (prior_alpha, prior_beta)
+
+    def test_receive_info_totals(self, algorithm):
+        algorithm.phase_1 = 0
+        algorithm.receive_info(1, 5, 2)
+        algorithm.receive_info(2, 3, 4)
+        algorithm.receive_info(1, 7, 2)
+        assert (algorithm.alpha_t, algorithm.beta_t) == (10, 6)
+        algorithm.phase_2 = 0
+        algorithm.update(WHITE_INDEX)
+        assert algorithm.decision == 1
+
+class TestGame():
+    @pytest.fixture()
+    def game(self):
+        return Game(1, [0.6], 'open', 5, 2, 2, headless=True)
+
+    def test_simulate(self, game):
+        frames, accuracy = game.simulate()
+        assert frames > 0
+        assert 0 <= accuracy <= 1
+        for ghost in game.ghosts:
+            assert ghost.algorithm.decision != -1
+
+    def test_run_simulations(self, game):
+        times, accuracies = game.run_simulations()
+        assert len(times) == 2
+        assert len(accuracies) == 2
+
+    def test_render_every(self):
+        game = Game(1, [0.6], 'open', 5, 1, 2, headless=True, render_every=3)
+        rendered = []
+        for game.frame in range(1, 10):
+            rendered.append(game.should_render())
+        assert rendered == [False, False, True] * 3
+        assert not game.lockstep
+
+    def test_fps(self):
+        game = Game(1, [0.6], 'open', 5, 1, 2, headless=True, fps=0.001)
+        game.frame = 1
+        assert game.should_render()
+        assert not game.should_render()
+
+    def test_lockstep(self, game):
+        assert game.lockstep
+
+    def test_navigation(self):
+        wall_map = Map('classic', [0.6])
+        cols, rows = wall_map.size()
+        for x in range(cols):
+            for y in range(rows):
+                cell = x * rows + y
+                moves = wall_map.nav_moves[wall_map.nav_offsets[cell]:wall_map.nav_offsets[cell + 1]]
+                expected = [] if wall_map.is_wall(x, y) else [i for i, (dx, dy) in enumerate(Actions.directions)
+                    if 0 <= x + dx < cols and 0 <= y + dy < rows and not wall_map.is_wall(x + dx, y + dy)]
+                assert moves.tolist() == expected
+        ghost = GhostAgent([1, 1], wall_map=wall_map, render=False)
+        for i in range(100):
+            ghost.walk()
+            assert wall_map.is_tile(*ghost.pos)
+
+
+class TestSwarm():
+    @pytest.fixture()
+    def game(self):
+        game = Game(1, [0.6], 'classic', 40, 1, 2, headless=True, engine='numpy')
+        game.start_simulation()
+        return game
+
+    def test_move(self, game):
+        swarm = game.swarm
+        for i in range(50):
+            swarm.move()
+            for x, y in swarm.pos[0]:
+                assert not game.map.is_wall(x, y)
+
+    def test_matches_object_engine(self):
+        # Both engines draw different random numbers, so only their statistics agree
+        results = {}
+        for engine, batch in (('object', 1), ('numpy', 96)):
+            game = Game(1, [0.6], 'open', 10, 96, 2, headless=True, engine=engine, batch=batch, seed=11, verbose=False)
+            times, accuracies = game.run_simulations()
+            results[engine] = (np.array(times), np.array(accuracies))
+        for values in zip(*results.values()):
+            difference = abs(values[0].mean() - values[1].mean())
+            error = np.sqrt(sum(value.var() / len(value) for value in values))
+            assert difference < max(4 * error, 0.01)
+
+    def test_neighbour_pairs(self, game):
+        swarm = game.swarm
+        for i in range(5):
+            swarm.move()
+        receivers, senders = swarm.neighbour_pairs()
+        pairs = set(zip(receivers.tolist(), senders.tolist()))
+        expected = set()
+        for i, a in enumerate(swarm.pos[0]):
+            for j, b in enumerate(swarm.pos[0]):
+                dx = (a[0] - b[0]) * CELL_WIDTH
+                dy = (a[1] - b[1]) * CELL_HEIGHT
+                if i != j and dx ** 2 + dy ** 2 <= COMMUNICATION_RADIUS ** 2:
+                    expected.add((i, j))
+        assert pairs == expected
+
+    def test_bayesian_decision(self, game):
+        while not game.swarm.all_decided():
+            game.swarm.step()
+        assert 0 <= game.swarm.get_average_accuracy()[0] <= 1
+
+    def test_benchmark_phases(self):
+        game = Game(2, [0.6], 'classic', 5, 1, 2, headless=True, engine='numpy')
+        game.start_simulation()
+        swarm = game.swarm
+        phase_1 = swarm.phase_1[0, 0]
+        for i in range(phase_1):
+            swarm.step()
+        assert (swarm.phase_1 == 0).all()
+        assert (swarm.alpha + swarm.beta == phase_1 + 2).all()
+        swarm.step()
+        assert swarm.seen[0].diagonal().all()
+        assert (swarm.decision == -1).all()
+
+    def test_requires_headless(self):
+        with pytest.raises(ValueError):
+            Game(1, [0.6], 'classic', 5, 1, 2, engine='numpy')
+
+    def test_batch(self):
+        game = Game(1, [0.6], 'line', 10, 6, 2, headless=True, engine='numpy')
+        times, accuracies, decisions = game.simulate_batch(6, seed=3)
+        assert len(times) == 6
+        assert all(frames > 0 for frames in times)
+        assert all(0 <= accuracy <= 1 for accuracy in accuracies)
+        assert all(sum(counts) == 10 for counts in decisions)
+        assert game.simulate_batch(6, seed=3) == (times, accuracies, decisions)
+
+    def test_batch_colours(self, game):
+        swarm = Swarm(1, game.map, 10, n_runs=3)
+        assert swarm.colours.shape[0] == 3
+        assert (swarm.colours[0] != swarm.colours[1]).any()
+
+    def test_batch_keep(self, game):
+        swarm = Swarm(2, game.map, 10, n_runs=3)
+        swarm.keep(np.array([True, False, True]))
+        assert swarm.runs.tolist() == [0, 2]
+        assert swarm.pos.shape == (2, 10, 2)
+        assert swarm.seen.shape == (2, 10, 10)
+
+    @pytest.mark.parametrize('engine', ['object', 'numpy'])
+    def test_simultaneous(self, engine):
+        game = Game(1, [0.5, 0.25], 'open', 20, 1, 3, headless=True, engine=engine, simultaneous=True)
+        game.simulate(seed=2)
+        assert game.colour_count == 0
+        assert sum(game.decision_counts()) == 20
+        if engine == 'object':
+            assert all(len(ghost.algorithm.pcs) == 3 for ghost in game.ghosts)
+        else:
+            assert np.isfinite(game.swarm.pcs).all()
+
+    def test_simultaneous_benchmark(self):
+        with pytest.raises(ValueError):
+            Game(2, [0.6], 'open', 20, 1, 2, headless=True, simultaneous=True)
+
+    def test_batch_multiple_colours(self):
+        game = Game(1, [0.5, 0.25], 'line', 10, 4, 3, headless=True, engine='numpy', batch=2, seed=1)
+        times, accuracies = game.run_simulations()
+        assert len(times) == 4
+
+
+class TestDecisionBoundary():
+    @pytest.fixture()
+    def boundary(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('algorithms.BOUNDARY_CACHE', str(tmp_path))
+        return DecisionBoundary(prior=1, posterior=0.95)
+
+    def test_decide(self, boundary):
+        for a in range(1, 80):
+            for b in range(1, 80):
+                p = beta.cdf(0.5, a, b)
+                expected = -1
+                if p > 0.95:
+                    expected = 0
+                elif (1 - p) > 0.95:
+                    expected = 1
+                assert boundary.decide(a, b) == expected
+
+    def test_grow(self, boundary):
+        boundary.grow(100)
+        assert len(boundary.lower) > 100
+        assert len(boundary.upper) == len(boundary.lower)
+
+    def test_save_load(self, boundary):
+        boundary.grow(200)
+        loaded = DecisionBoundary(prior=1, posterior=0.95)
+        loaded.load()
+        assert (loaded.lower == boundary.lower).all()
+        assert (loaded.upper == boundary.upper).all()
+
+    def test_shared(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('algorithms.BOUNDARY_CACHE', str(tmp_path))
+        monkeypatch.setattr(DecisionBoundary, 'tables', {})
+        assert DecisionBoundary.get(1, 0.99) is BayesianAlgorithm().boundary
+
+
+class TestSpatialHash():
+    @pytest.fixture()
+    def game(self):
+        game = Game(1, [0.6], 'open', 60, 1, 2, headless=True)
+        game.start_simulation()
+        return game
+
+    def test_query_matches_circle_collision(self, game):
+        def circle(ghost):
+            sprite = pygame.sprite.Sprite()
+            sprite.rect = pygame.Rect(0, 0, CELL_WIDTH, CELL_HEIGHT)
+            sprite.rect.center = (ghost.pos[0]*CELL_WIDTH+10, ghost.pos[1]*CELL_HEIGHT+10)
+            sprite.ghost = ghost
+            return sprite
+
+        for i in range(5):
+            for ghost in game.ghosts:
+                ghost.walk()
+            sprites = [circle(ghost) for ghost in game.ghosts]
+            for sprite in sprites:
+                collided = pygame.sprite.spritecollide(sprite, sprites, False, pygame.sprite.collide_circle_ratio(2.0))
+                collided.remove(sprite)
+                assert set(game.neighbours.query(sprite.ghost)) == {other.ghost for other in collided}
+
+    def test_move(self, game):
+        ghost = game.ghosts[0]
+        for i in range(20):
+            ghost.walk()
+        assert game.neighbours.keys[ghost] == game.neighbours.key(ghost.pos)
+        assert ghost in game.neighbours.buckets[game.neighbours.key(ghost.pos)]
+
+    def test_radius(self):
+        index = SpatialHash(radius=CELL_WIDTH)
+        a = GhostAgent([1, 1], render=False)
+        b = GhostAgent([2, 1], render=False)
+        c = GhostAgent([1, 2], render=False)
+        for ghost in (a, b, c):
+            index.insert(ghost)
+        assert index.query(a) == [b]
+
+
+class TestRunner():
+    def test_run_seeds(self):
+        assert run_seeds(7, 5) == run_seeds(7, 5)
+        assert len(set(run_seeds(7, 5))) == 5
+
+    def test_simulate_seeded(self):
+        game = Game(1, [0.6], 'open', 5, 1, 2, headless=True)
+        assert game.simulate(11) == game.simulate(11)
+
+    def test_games_cache(self, monkeypatch):
+        monkeypatch.setattr('runner.games', {})
+        config = {'algorithm_id': 1, 'ratio': [0.6], 'map_name': 'open', 'n_ghosts': 5, 'n_colours': 2}
+        simulate(config, 1)
+        simulate(dict(config, map_name='line'), 1)
+        assert list(runner.games) == [repr(sorted(dict(config, map_name='line').items()))]
+
+    def test_parallel_matches_sequential(self):
+        sequential = Game(1, [0.6], 'open', 5, 4, 2, headless=True, seed=5)
+        parallel = Game(1, [0.6], 'open', 5, 4, 2, headless=True, seed=5, workers=2)
+        assert parallel.run_simulations() == sequential.run_simulations()
+
+
+class TestStartup():
+    def test_headless_imports(self, tmp_path, monkeypatch):
+        # Workers find the decision table in the cache
+        monkeypatch.setattr('algorithms.BOUNDARY_CACHE', str(tmp_path))
+        DecisionBoundary(1, 0.99).grow(4096)
+        # A fresh interpreter, as every worker process is one
+        code = ("import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import numpy\n"
+            "numpy_time = time.perf_counter() - start\n"
+            "import algorithms\n"
+            "from game import Game\n"
+            "game_time = time.perf_counter() - start - numpy_time\n"
+            f"algorithms.BOUNDARY_CACHE = {str(tmp_path)!r}\n"
+            "Game(1, [0.6], 'open', 5, 1, 2, headless=True, verbose=False).simulate(1)\n"
+            "print(numpy_time, game_time, *sorted(m for m in ('pygame', 'scipy', 'matplotlib') if m in sys.modules))\n")
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        numpy_time, game_time, *heavy = output.split()
+        assert heavy == []
+        # Importing pygame, scipy and matplotlib took about 20 times as long as NumPy
+        assert float(game_time) < 4 * float(numpy_time)
+
+
+class TestResults():
+    def test_store(self, tmp_path):
+        path = str(tmp_path / 'results.jsonl')
+        with ResultStore(path) as store:
+            store.append({'config': {'n_ghosts': 5}, 'seed': 1, 'frames': 10, 'accuracy': 1.0})
+            store.append({'config': {'n_ghosts': 5}, 'seed': 2, 'frames': 30, 'accuracy': 0.5})
+        with open(path, 'a') as file:
+            file.write('{"config": {"n_gh')
+        assert len(list(read_results(path))) == 2
+        assert [row['frames'] for row in read_results(path, seed=2)] == [30]
+        summary, = summarise(read_results(path)).values()
+        assert summary.runs == 2
+        assert summary.mean_frames() == 20
+        assert summary.mean_accuracy() == 0.75
+
+    def test_summary_decisions(self):
+        summary = Summary()
+        summary.add({'frames': 1, 'accuracy': 1.0, 'decisions': [3, 2]})
+        summary.add({'frames': 1, 'accuracy': 1.0, 'decisions': [1, 0, 4]})
+        assert summary.decisions == [4, 2, 4]
+
+    def test_game_rows(self, tmp_path):
+        output = str(tmp_path / 'results.jsonl')
+        game = Game(1, [0.6], 'open', 5, 3, 2, headless=True, seed=4, output=output, verbose=False)
+        with pytest.raises(SystemExit):
+            game.run()
+        rows = list(read_results(output))
+        assert sorted(row['run'] for row in rows) == [0, 1, 2]
+        assert all(row['config'] == game.config() and row['seed'] == 4 for row in rows)
+        assert all(sum(row['decisions']) == 5 and row['wall_time'] > 0 for row in rows)
+        assert all(row['accuracy'] == row['decisions'][0] / 5 for row in rows)
+
+
+class TestProfiler():
+    def test_frames(self):
+        timer = Profiler()
+        timer.enabled = True
+        timer.add('walk', 0.0)
+        timer.end_frame()
+        timer.end_frame()
+        summary = timer.summary()
+        assert summary['frames'] == 2
+        assert summary['phases']['walk']['max'] == summary['phases']['walk']['total'] > 0
+        assert summary['phases']['walk']['mean'] == summary['phases']['walk']['total'] / 2
+
+    @pytest.mark.parametrize('engine', ['object', 'numpy'])
+    def test_profile_run(self, engine):
+        game = Game(1, [0.6], 'open', 10, 1, 2, headless=True, engine=engine, profile=True, verbose=False)
+        # The decision table is grown by the first run, which evaluates more CDFs
+        game.play(seed=2)
+        result, = game.play(seed=2)
+        profile = result['profile']
+        assert profile['frames'] == result['frames']
+        assert profile['counts']['cdf'] == 10
+        assert profile['counts']['broadcasts'] > 0
+        assert profile['counts']['collisions'] >= 10 * result['frames']
+        assert tuple(profile['phases']) == PHASES
+        assert all(profile['phases'][phase]['total'] > 0 for phase in ('walk', 'algorithm', 'communication'))
+        assert not profiler.enabled
+
+    def test_profile_batch(self):
+        game = Game(1, [0.6], 'open', 10, 1, 2, headless=True, engine='numpy', batch=3, profile=True, verbose=False)
+        game.play(seed=2, n_runs=3)
+        results = game.play(seed=2, n_runs=3)
+        profile = results[0]['profile']
+        assert profile['runs'] == 3
+        assert profile['frames'] == max(result['frames'] for result in results)
+        assert profile['counts']['cdf'] == 30
+        assert all(profile['phases'][phase]['total'] > 0 for phase in ('walk', 'algorithm', 'communication'))
+
+    @pytest.mark.parametrize('engine', ['object', 'numpy'])
+    @pytest.mark.parametrize('algorithm', [1, 2])
+    def test_counters(self, engine, algorithm, tmp_path, monkeypatch):
+        monkeypatch.setattr('algorithms.BOUNDARY_CACHE', str(tmp_path))
+        monkeypatch.setattr(DecisionBoundary, 'tables', {})
+        game = Game(algorithm, [0.6], 'open', 10, 1, 2, headless=True, engine=engine, verbose=False)
+        game.start_simulation(3)
+        profiler.reset()
+        profiler.enabled = True
+        try:
+            for _ in range(20):
+                game.game_loop()
+        finally:
+            profiler.enabled = False
+        # Every agent is at least in range of itself
+        assert profiler.counts['collisions'] >= 10 * 20
+        if algorithm == 1:
+            # The empty decision table is computed by bisection on the CDF
+            assert profiler.counts['cdf'] > 0
+
+    def test_disabled(self):
+        game = Game(1, [0.6], 'open', 10, 1, 2, headless=True, verbose=False)
+        result, = game.play(seed=2)
+        assert 'profile' not in result
+        assert profiler.frames == 0
+
+
+class TestBenchmarkSuite():
+    def test_cases(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'layouts').mkdir()
+        cases = suite_cases('full')
+        assert len({case['name'] for case in cases}) == len(cases)
+        ghosts = [case['config']['n_ghosts'] for case in cases]
+        assert max(ghosts) == 5000
+        assert {case['config']['map_name'] for case in cases} >= {'classic', 'line', 'open'}
+
+    def test_compare(self):
+        baseline = {'a': {'fps': 100.0, 'frames': 100, 'wall_time': 1.0},
+            'b': {'fps': 100.0, 'frames': 100, 'wall_time': 1.0}}
+        results = {'a': {'fps': 95.0, 'frames': 100, 'wall_time': 1.05},
+            'b': {'fps': 50.0, 'frames': 101, 'wall_time': 2.0}, 'c': {'fps': 1.0, 'frames': 1, 'wall_time': 9.0}}
+        regressions = compare(results, baseline, 0.1)
+        assert len(regressions) == 3
+        assert all(regression.startswith('b:') for regression in regressions)
+
+    def test_compare_short_cases(self):
+        # Cases shorter than MIN_FRAMES are only compared by their frames
+        baseline = {'a': {'fps': 100.0, 'frames': MIN_FRAMES - 1, 'wall_time': 1.0}}
+        results = {'a': {'fps': 50.0, 'frames': MIN_FRAMES - 1, 'wall_time': 2.0}}
+        assert compare(results, baseline, 0.1) == []
+        results['a']['frames'] = MIN_FRAMES
+        assert len(compare(results, baseline, 0.1)) == 1
+
+    def test_suite_ghosts(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'layouts').mkdir()
+        for suite in ('quick', 'full'):
+            assert all(25 <= case['config']['n_ghosts'] <= 5000 for case in suite_cases(suite))
+
+    def test_measure_stops_at_consensus(self, monkeypatch):
+        running = []
+        game_loop = Game.game_loop
+        def loop(game):
+            running.append(game.running)
+            game_loop(game)
+        monkeypatch.setattr(Game, 'game_loop', loop)
+        case = {'name': 'early', 'seed': 1,
+            'config': {'algorithm_id': 1, 'ratio': [0.6], 'map_name': 'open', 'n_ghosts': 10, 'n_colours': 2}}
+        result = measure(case, repeats=1)
+        assert result['frames'] < WINDOW
+        assert all(running)
+
+
+class TestSweep():
+    def test_expand(self):
+        configs = expand({'grid': {'ghosts': [5, 10], 'ratio': [[0.6], [0.6, 0.2]]},
+            'configs': [{'algorithm': 'benchmark'}]})
+        assert len(configs) == 5
+        assert [config['colours'] for config in configs[:4]] == [2, 3, 2, 3]
+        assert configs[4]['algorithm'] == 'benchmark'
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            expand({'grid': {'agents': [5]}})
+        with pytest.raises(ValueError):
+            game_config(expand({'fixed': {'algorithm': 'benchmark', 'ratio': [0.6, 0.2]}})[0])
+
+    def test_run_sweep(self, tmp_path):
+        output = tmp_path / 'results.jsonl'
+        spec = {'runs': 2, 'seed': 3, 'fixed': {'map': 'open', 'ghosts': 5}, 'grid': {'ratio': [[0.6], [0.7]]}}
+        assert run_sweep(spec, str(output)) == 4
+        rows = [json.loads(line) for line in output.read_text().splitlines()]
+        assert sorted((row['config']['ratio'][0], row['run']) for row in rows) == [(0.6, 0), (0.6, 1), (0.7, 0), (0.7, 1)]
+        assert all(row['frames'] > 0 for row in rows)
+
+
+class TestLayout():
+    @pytest.fixture()
+    def layouts(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'layouts').mkdir()
+        (tmp_path / 'layouts' / 'small.lay').write_text('%%%%\n%**%\n%*%%\n%%%%')
+        return tmp_path / 'layouts'
+
+    def test_compile(self):
+        layout = compile_layout('%%%%\n%**%\n%*%%\n%%%%')
+        assert layout.walls.shape == (4, 4)
+        assert layout.tiles.tolist() == [[1, 1], [2, 1], [1, 2]]
+        assert layout.tile_index[2, 1] == 1
+        assert layout.tile_index[0, 0] == -1
+        assert layout.walls[2, 2]
+
+    def test_cache(self, layouts):
+        load_layout('small')
+        assert (layouts / 'small.npz').exists()
+        layout = load_layout('small')
+        assert isinstance(layout.walls, np.memmap)
+        assert layout.tiles.tolist() == [[1, 1], [2, 1], [1, 2]]
+
+    def test_cache_invalidated(self, layouts):
+        load_layout('small')
+        (layouts / 'small.lay').write_text('%%%%\n%**%\n%**%\n%%%%')
+        assert len(load_layout('small').tiles) == 4
+
+    def test_map_colours(self, layouts):
+        wall_map = Map('small', [0.34])
+        assert wall_map.size() == (4, 4)
+        assert sorted(wall_map.tile_colours.tolist()) == [WHITE_INDEX, GREY_INDEX, GREY_INDEX]
+        assert wall_map.get_tile_colour(0, 0) == NO_COLOUR
+        assert wall_map.is_tile(1, 2) and not wall_map.is_tile(2, 2)
+
+
+class TestGenerate():
+    @pytest.mark.parametrize('kind', ['open', 'corridors', 'maze'])
+    @pytest.mark.parametrize('density', [0, 0.5, 1])
+    def test_connected(self, kind, density):
+        from scipy import ndimage
+        for width, height in [(5, 5), (30, 17), (101, 60)]:
+            walls = generate_walls(kind, width, height, density, seed=2)
+            assert walls.shape == (width, height)
+            assert walls[0].all() and walls[-1].all() and walls[:, 0].all() and walls[:, -1].all()
+            assert ndimage.label(~walls)[1] == 1
+
+    def test_seeded(self):
+        assert (generate_walls('maze', 40, 30, seed=1) == generate_walls('maze', 40, 30, seed=1)).all()
+        assert (generate_walls('maze', 40, 30, seed=1) != generate_walls('maze', 40, 30, seed=2)).any()
+
+    def test_text(self):
+        walls = generate_walls('corridors', 12, 9, 0.5, seed=3)
+        assert (compile_layout(layout_text(walls)).walls == walls).all()
+
+    def test_map(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'layouts').mkdir()
+        name = write_layout('maze', 301, 201, 0.5, seed=4)
+        wall_map = Map(name, [0.6])
+        walls = generate_walls('maze', 301, 201, 0.5, seed=4)
+        assert wall_map.size() == (301, 201)
+        assert len(wall_map.tile_colours) == (~walls).sum()
+        assert wall_map.is_wall(0, 0) and not wall_map.is_wall(1, 1)
+        assert wall_map.get_tile_colour(1, 1) in (WHITE_INDEX, GREY_INDEX)
+        swarm = Swarm(1, wall_map, 50)
+        swarm.step()
+        assert not walls[swarm.pos[0, :, 0], swarm.pos[0, :, 1]].any()
+
+
+class TestCheckpoint():
+    def interrupted(self, path, engine, frames):
+        game = Game(1, [0.6], 'classic', 25, 3, 2, headless=True, engine=engine, seed=11,
+            verbose=False, checkpoint=path, checkpoint_every=0)
+        loop = game.game_loop
+        def game_loop():
+            if game.frame == frames and len(game.done) == 1:
+                raise KeyboardInterrupt
+            loop()
+        game.game_loop = game_loop
+        with pytest.raises(KeyboardInterrupt):
+            game.run_simulations()
+
+    def test_atomic(self, tmp_path):
+        path = str(tmp_path / 'run.ckpt')
+        save_checkpoint(path, {'done': {0: {'frames': 3}}})
+        assert load_checkpoint(path)['done'] == {0: {'frames': 3}}
+        assert [p.name for p in tmp_path.iterdir()] == ['run.ckpt']
+
+    @pytest.mark.parametrize('engine', ['object', 'numpy'])
+    def test_resume(self, tmp_path, engine):
+        path = str(tmp_path / 'run.ckpt')
+        expected = Game(1, [0.6], 'classic', 25, 3, 2, headless=True, engine=engine, seed=11,
+            verbose=False).run_simulations()
+        self.interrupted(path, engine, 10)
+        game = Game(1, [0.6], 'classic', 25, 3, 2, headless=True, engine=engine, verbose=False,
+            checkpoint=path, resume=True)
+        assert game.seed == 11 and list(game.done) == [0] and game.resumed['frame'] == 10
+        assert game.run_simulations() == expected
+
+    def test_other_configuration(self, tmp_path):
+        path = str(tmp_path / 'run.ckpt')
+        self.interrupted(path, 'object', 5)
+        with pytest.raises(ValueError):
+            Game(1, [0.6], 'classic', 25, 3, 2, headless=True, seed=12, verbose=False,
+                checkpoint=path, resume=True)
+        with pytest.raises(ValueError):
+            Game(1, [0.6], 'open', 25, 3, 2, headless=True, verbose=False, checkpoint=path, resume=True)
+
+    def test_agent_state(self):
+        game = Game(1, [0.6], 'classic', 100, 1, 2, headless=True, seed=1, verbose=False)
+        game.start_simulation(1)
+        ghost = pickle.loads(pickle.dumps(game.ghosts[0]))
+        # Neither the map nor the other agents in the spatial index are pickled
+        assert len(pickle.dumps(game.ghosts[0])) < 2000
+        assert ghost.index is None and ghost.map is None
+        assert ghost.pos == game.ghosts[0].pos
+
+    def test_skip_done(self):
+        task = lambda config, seed, n_runs: [{'frames': seed}] * n_runs
+        rows = list(run_rows({}, 5, 1, 3, 2, task, done={0, 1, 2}))
+        assert [row['run'] for row in rows] == [3, 4]
+
+
+class TestTelemetry():
+    def get(self, telemetry, path='/'):
+        with urllib.request.urlopen(f'http://127.0.0.1:{telemetry.port}{path}') as response:
+            return json.loads(response.read())
+
+    def test_snapshot(self):
+        telemetry = Telemetry(0, interval=0, n_runs=2)
+        try:
+            telemetry.update(10, lambda: (4, 30))
+            telemetry.add({'frames': 10, 'accuracy': 1.0})
+            snapshot = self.get(telemetry)
+            assert snapshot['run'] == 1 and snapshot['runs'] == 2
+            assert snapshot['frame'] == 10 and snapshot['undecided'] == 4
+            assert snapshot['fps'] > 0 and snapshot['messages_per_second'] > 0
+            assert snapshot['completed']['mean_frames'] == 10
+            with pytest.raises(urllib.error.HTTPError):
+                self.get(telemetry, '/other')
+        finally:
+            telemetry.close()
+
+    @pytest.mark.parametrize('engine', ['object', 'numpy'])
+    def test_game(self, engine):
+        game = Game(1, [0.6], 'classic', 25, 2, 2, headless=True, engine=engine, seed=1,
+            verbose=False, telemetry=0)
+        game.telemetry.interval = 0
+        for row in game.results():
+            snapshot = self.get(game.telemetry, '/telemetry')
+            assert snapshot['frame'] == row['frames']
+            assert snapshot['completed']['runs'] == row['run'] + 1
+            assert snapshot['config'] == game.config()
+        assert snapshot['completed']['runs'] == 2
+        # The server is closed once the runs end
+        with pytest.raises(urllib.error.URLError):
+            self.get(game.telemetry)
+
+
+class TestTrace():
+    def test_roundtrip(self, tmp_path):
+        path = str(tmp_path / 'run.trace')
+        writer = TraceWriter(path, 3, {'map_name': 'open'}, np.array([0, 1, 1, 0]), chunk=4)
+        for frame in range(10):
+            writer.write([[frame, 1], [2, 3], [4, 5]], [-1, 0, 1], [frame, 0, 2])
+            if frame == 5:
+                assert len(TraceReader(path)) == 4
+        writer.close()
+        trace = TraceReader(path)
+        assert len(trace) == 10
+        assert trace.header['map_name'] == 'open'
+        assert trace.tile_colours.tolist() == [0, 1, 1, 0]
+        assert trace.agent_colours is None
+        assert trace[7]['pos'].tolist() == [[7, 1], [2, 3], [4, 5]]
+        assert trace[7]['decision'].tolist() == [-1, 0, 1]
+        assert trace.frames['contacts'][:, 0].tolist() == list(range(10))
+
+    @pytest.mark.parametrize('engine', ['object', 'numpy'])
+    def test_game(self, tmp_path, engine):
+        game = Game(1, [0.6], 'open', 10, 1, 2, headless=True, engine=engine, trace=str(tmp_path), verbose=False)
+        frames, accuracy = game.simulate(seed=3)
+        trace = TraceReader(str(tmp_path / '3.trace'))
+        assert len(trace) == frames
+        assert trace.header['seed'] == 3 and trace.header['size'] == list(game.map.size())
+        assert (trace[frames - 1]['decision'] != -1).all()
+        assert not game.map.walls[trace.frames['pos'][..., 0], trace.frames['pos'][..., 1]].any()
+        assert trace.frames['contacts'].sum() > 0
+        if engine == 'object':
+            assert [AGENTS_COLOURS[colour] for colour in trace.agent_colours] == [ghost.colour for ghost in game.ghosts]
+
+    def test_requires_single_runs(self, tmp_path):
+        with pytest.raises(ValueError):
+            Game(1, [0.6], 'open', 10, 4, 2, headless=True, engine='numpy', batch=2, trace=str(tmp_path))
+
+
+class TestReplay():
+    @pytest.fixture()
+    def replay(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        game = Game(1, [0.6], 'open', 10, 1, 2, headless=True, trace=str(tmp_path), verbose=False)
+        self.frames, _ = game.simulate(seed=5)
+        self.game = game
+        replay = Replay(str(tmp_path / '5.trace'))
+        replay.renderer.reset()
+        return replay
+
+    def test_tile_colours(self, replay):
+        game_map = Map('open', [0.6])
+        assert (replay.map.tile_colours == WHITE_INDEX).sum() == (game_map.tile_colours == WHITE_INDEX).sum()
+        assert replay.map.tile_colours.tolist() == replay.trace.tile_colours.tolist()
+
+    def test_agent_colours(self, replay):
+        assert [agent.colour for agent in replay.agents] == [ghost.colour for ghost in self.game.ghosts]
+
+    def test_seek(self, replay):
+        replay.seek(self.frames + 10)
+        assert replay.frame() == self.frames - 1
+        replay.seek(-1)
+        assert replay.frame() == 0
+        replay.seek(self.frames // 2)
+        replay.show(replay.frame())
+        record = replay.trace[self.frames // 2]
+        assert [agent.pos for agent in replay.agents] == record['pos'].tolist()
+        assert [agent.decision for agent in replay.agents] == record['decision'].tolist()
+
+    def test_matches_full_redraw(self, replay):
+        replay.show(3)
+        replay.show(self.frames - 1)
+        expected = pygame.Surface(replay.screen.get_size())
+        expected.fill(BLACK)
+        replay.renderer.draw_layout(expected)
+        replay.all_sprites.draw(expected)
+        assert pygame.image.tobytes(replay.screen, 'RGB') == pygame.image.tobytes(expected, 'RGB')
+        assert {sprite.image_name for sprite in replay.all_sprites} <= {'black', 'white'}
+
+
+class TestGhostImages():
+    @pytest.fixture()
+    def wall_map(self, monkeypatch):
+        monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        pygame.display.set_mode((10, 10))
+        return Map('open', [0.6])
+
+    def test_shared(self, wall_map):
+        a = GhostAgent([1, 1], 'pink', wall_map, BayesianAlgorithm())
+        b = GhostAgent([2, 1], 'pink', wall_map, BayesianAlgorithm())
+        assert a.sprite.image is b.sprite.image
+        assert a.sprite.image is load_image('pink')
+
+    def test_headless_has_no_sprite(self):
+        ghost = GhostAgent([1, 1], render=False)
+        assert ghost.sprite is None
+        assert not hasattr(ghost, '__dict__')
+        assert not hasattr(BayesianAlgorithm(), '__dict__')
+        assert not hasattr(BenchmarkAlgorithm(5), '__dict__')
+
+    def test_switch_on_decision(self, wall_map, monkeypatch):
+        ghost = GhostAgent([1, 1], 'pink', wall_map, BayesianAlgorithm())
+        loads = []
+        monkeypatch.setattr('renderer.load_image', lambda name: loads.append(name) or images[name])
+        load_image('white')
+        ghost.algorithm.decision = 1
+        for i in range(5):
+            ghost.sprite.update()
+        assert loads == ['white']
+        assert ghost.sprite.image is images['white']
+
+
+class TestRenderer():
+    @pytest.fixture()
+    def game(self, monkeypatch):
+        monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        game = Game(1, [0.6], 'open', 20, 1, 2)
+        game.start_simulation(seed=1)
+        return game
+
+    def test_matches_full_redraw(self, game):
+        for i in range(10):
+            game.update()
+            game.draw()
+        expected = pygame.Surface(game.screen.get_size())
+        expected.fill(BLACK)
+        game.renderer.draw_layout(expected)
+        game.all_sprites.draw(expected)
+        assert pygame.image.tobytes(game.screen, 'RGB') == pygame.image.tobytes(expected, 'RGB')
+
+    def test_unchanged_not_redrawn(self, game, monkeypatch):
+        game.draw()
+        updates = []
+        monkeypatch.setattr(pygame.display, 'update', lambda *args: updates.append(args))
+        game.draw()
+        assert updates == []
+
+    def test_quit_stops_runs(self, monkeypatch, capsys):
+        monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        game = Game(1, [0.6], 'open', 20, 3, 2, seed=1, verbose=False)
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        assert list(game.results()) == []
+        assert game.aborted
+        assert capsys.readouterr().out == 'Simulation 1 was aborted\n'
@@ -0,0 +1,166 @@
+import json
+import os
+import struct
+import numpy as np
+
+# First bytes of every trace file
+MAGIC = b'GHOSTTRC'
+VERSION = 1
+# Magic, version, length of the JSON header and number of frames
+PREAMBLE = struct.Struct('<8sIIQ')
+
+def frame_dtype(n_agents:int) -> np.dtype:
+    """Return the fixed-width record of a frame.
+
+    Args:
+        n_agents (int): number of agents
+
+    Returns:
+        np.dtype: int16 x and y of every agent, int8 decision of every agent
+            and uint16 number of agents within its communication radius
+    """
+    return np.dtype([('pos', '<i2', (n_agents, 2)), ('decision', 'i1', (n_agents,)),
+        ('contacts', '<u2', (n_agents,))])
+
+def aligned(size:int, alignment:int = 8) -> int:
+    """Round a size in bytes up to a multiple of the alignment.
+
+    Args:
+        size (int): size in bytes
+        alignment (int, optional): alignment in bytes. Defaults to 8.
+
+    Returns:
+        int: aligned size
+    """
+    return -(-size // alignment) * alignment
+
+class TraceWriter:
+    """
+    Writes the positions, decisions and communication of every agent at
+    every frame to a binary file. The file starts with a JSON header that
+    describes the map, the configuration and the colour of every agent,
+    followed by the colour of every tile and one fixed-width record per frame. Frames are written into a
+    memory-mapped chunk of the file that is extended a chunk at a time, and
+    the number of frames in the header is updated with every chunk, so a
+    killed run leaves a readable trace.
+    """
+    def __init__(self, path:str, n_agents:int, header:dict, tile_colours:np.ndarray, agent_colours:list = None, chunk:int = 256) -> None:
+        """Create trace file
+
+        Args:
+            path (str): path of the trace file
+            n_agents (int): number of agents
+            header (dict): description of the map and configuration, written as JSON
+            tile_colours (np.ndarray): index in COLOURS of the colour of every tile
+            agent_colours (list[int], optional): index in AGENTS_COLOURS of
+                the colour of every agent. Defaults to None, for agents
+                without colours.
+            chunk (int, optional): number of frames mapped at once. Defaults to 256.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.dtype = frame_dtype(n_agents)
+        self.chunk = chunk
+        self.frames = 0
+        header = dict(header, n_agents=n_agents, n_tiles=len(tile_colours))
+        if agent_colours is not None:
+            header['agent_colours'] = [int(colour) for colour in agent_colours]
+        text = json.dumps(header).encode()
+        text += b' ' * (aligned(PREAMBLE.size + len(text)) - PREAMBLE.size - len(text))
+        colours = np.asarray(tile_colours, dtype=np.uint8).tobytes()
+        colours += bytes(aligned(len(colours)) - len(colours))
+        self.offset = PREAMBLE.size + len(text) + len(colours)
+        self.file = open(path, 'wb+')
+        self.file.write(PREAMBLE.pack(MAGIC, VERSION, len(text), 0))
+        self.file.write(text)
+        self.file.write(colours)
+        self.buffer = None
+
+    def map_chunk(self) -> None:
+        """Extend the file by a chunk and map it.
+        """
+        start = self.offset + self.frames * self.dtype.itemsize
+        self.file.truncate(start + self.chunk * self.dtype.itemsize)
+        self.buffer = np.memmap(self.file, dtype=self.dtype, mode='r+', offset=start, shape=(self.chunk,))
+        self.used = 0
+
+    def write(self, pos, decision, contacts) -> None:
+        """Record a frame.
+
+        Args:
+            pos (np.ndarray): x and y of every agent
+            decision (np.ndarray): decision of every agent
+            contacts (np.ndarray): number of agents within the communication
+                radius of every agent
+        """
+        if self.buffer is None:
+            self.map_chunk()
+        record = self.buffer[self.used]
+        record['pos'] = pos
+        record['decision'] = decision
+        record['contacts'] = contacts
+        self.used += 1
+        if self.used == self.chunk:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the mapped frames to disk and update the number of frames.
+        """
+        if self.buffer is None:
+            return
+        self.buffer.flush()
+        self.frames += self.used
+        self.buffer = None
+        self.file.seek(PREAMBLE.size - 8)
+        self.file.write(struct.pack('<Q', self.frames))
+        self.file.flush()
+
+    def close(self) -> None:
+        """Write the last frames and cut the unused part of the last chunk.
+        """
+        self.flush()
+        self.file.truncate(self.offset + self.frames * self.dtype.itemsize)
+        self.file.close()
+
+class TraceReader:
+    """
+    Reads a trace file. Frames are memory mapped, so they are only read from
+    disk when they are accessed.
+    """
+    def __init__(self, path:str) -> None:
+        """Open trace file
+
+        Args:
+            path (str): path of the trace file
+        """
+        with open(path, 'rb') as file:
+            magic, version, length, frames = PREAMBLE.unpack(file.read(PREAMBLE.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{path} is not a trace file')
+            self.header = json.loads(file.read(length))
+        self.n_agents = self.header['n_agents']
+        # None if the agents of the run had no colours
+        self.agent_colours = self.header.get('agent_colours')
+        self.dtype = frame_dtype(self.n_agents)
+        start = PREAMBLE.size + length
+        self.tile_colours = np.memmap(path, dtype=np.uint8, mode='r', offset=start,
+            shape=(self.header['n_tiles'],))
+        offset = start + aligned(self.header['n_tiles'])
+        self.frames = np.memmap(path, dtype=self.dtype, mode='r', offset=offset,
+            shape=(frames,)) if frames else np.zeros(0, dtype=self.dtype)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, frame:int):
+        """Return the record of a frame.
+
+        Args:
+            frame (int): index of the frame
+
+        Returns:
+            np.void: positions, decisions and contacts of the agents
+        """
+        return self.frames[frame]